@@ -0,0 +1,387 @@
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+ROOT_DIR = Path(os.path.realpath(__file__)).parent.parent
+SRC_DIR = ROOT_DIR / "src"
+BASELINE_PATH = ROOT_DIR / "bench" / "baseline.json"
+sys.path.insert(0, str(SRC_DIR))
+
+import httpx
+import psutil
+import service
+from analytics import FanAnalytics
+from control import ControlState, approach_pwm, temp_to_pwm
+from models import SystemStatus
+from protocol import decode_status, encode_status
+
+# ==============================
+# HARNESS
+# ==============================
+MIN_RUN_TIME = 0.25
+REPEAT = 15
+DEFAULT_THRESHOLD = 0.15
+
+# (median ns per call, spread of the runs as a fraction of the median)
+Sample = Tuple[float, float]
+
+BENCHMARKS: Dict[str, Callable[[], Sample]] = {}
+
+def summarize(runs: List[float]) -> Sample:
+    # The median and interquartile range ignore the odd run hit by a context switch
+    q1, median, q3 = statistics.quantiles(runs, n=4)
+    return median, (q3 - q1) / median
+
+def measure(fn: Callable[[], object], min_time: float = MIN_RUN_TIME, repeat: int = REPEAT) -> Sample:
+    # Grow the batch until one run takes min_time, then time `repeat` runs of it
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+
+    runs = []
+    # Like timeit, keep collections out of the timed runs
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            runs.append((time.perf_counter() - start) / number * 1e9)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return summarize(runs)
+
+def benchmark(name: str):
+    def register(fn: Callable[[], Sample]):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+# ==============================
+# FIXTURES
+# ==============================
+def fake_record(i: int) -> bytes:
+    record = bytearray(42)
+    record[0:6] = bytes([0x58, 0xcc, 0x1e, 0xa7, i >> 8, i & 0xFF])
+    record[6:12] = bytes([0x2e, 0xc1, 0x1e, 0xa7, 0x14, 0x54])
+    record[12] = 8
+    record[13] = 1
+    record[19] = 13
+    for j in range(4):
+        rpm = 700 + i + j
+        record[28 + j * 2] = rpm >> 8
+        record[29 + j * 2] = rpm & 0xFF
+    record[36:40] = bytes([64] * 4)
+    record[41] = 28
+    return bytes(record)
+
+def fake_page(count: int) -> bytes:
+    page = bytearray(4)
+    page[1] = count
+    for i in range(count):
+        page += fake_record(i)
+    return bytes(page) + bytes(max(0, service.RF_PAGE_STRIDE - len(page)))
+
+def fake_fans(count: int):
+    fans = service.parse_fans(fake_page(count), 90)
+    analytics = FanAnalytics()
+    for f in fans:
+        analytics.update(f)
+    return fans
+
+def fake_status(count: int) -> SystemStatus:
+    return SystemStatus(timestamp=time.time(), cpu_temp=52.5, fans=fake_fans(count))
+
+# Serves the same page to fetch_page on every request, like an idle controller
+class FakeRx:
+    def __init__(self, page: bytes):
+        self.page = page
+        self.pending = b""
+
+    def write(self, endpoint, data, timeout=None):
+        self.pending = self.page
+        return len(data)
+
+    def read(self, endpoint, size, timeout=None):
+        chunk = self.pending[:size]
+        self.pending = self.pending[len(chunk):]
+        return chunk
+
+def make_sysfs(root: Path, chips: int = 4, sensors: int = 8):
+    for c in range(chips):
+        hwmon = root / "class" / "hwmon" / f"hwmon{c}"
+        hwmon.mkdir(parents=True)
+        (hwmon / "name").write_text("k10temp\n" if c == 0 else f"chip{c}\n")
+        for s in range(1, sensors + 1):
+            (hwmon / f"temp{s}_input").write_text(f"{40000 + c * 1000 + s * 100}\n")
+            (hwmon / f"temp{s}_max").write_text("95000\n")
+            (hwmon / f"temp{s}_crit").write_text("105000\n")
+            label = "Tctl" if c == 0 and s == 1 else f"Sensor {s}"
+            (hwmon / f"temp{s}_label").write_text(f"{label}\n")
+
+@contextlib.contextmanager
+def fake_sysfs(root: Path):
+    # psutil hardcodes /sys, so redirect its globbing into the fake tree
+    import psutil._pslinux as pslinux
+    real_glob = pslinux.glob.glob
+
+    class RedirectedGlob:
+        @staticmethod
+        def glob(pattern, *args, **kwargs):
+            if pattern.startswith("/sys/"):
+                pattern = str(root) + pattern[len("/sys"):]
+            return real_glob(pattern, *args, **kwargs)
+
+    real_module = pslinux.glob
+    pslinux.glob = RedirectedGlob
+    try:
+        yield
+    finally:
+        pslinux.glob = real_module
+
+@contextlib.contextmanager
+def uds_server():
+    import uvicorn
+
+    sock = os.path.join(tempfile.mkdtemp(), "bench.sock")
+    server = uvicorn.Server(uvicorn.Config(service.app, uds=sock, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started and time.time() < deadline:
+        time.sleep(0.01)
+    try:
+        yield sock
+    finally:
+        server.should_exit = True
+        thread.join(5)
+
+
+# ==============================
+# BENCHMARKS
+# ==============================
+def register_parse_benchmarks():
+    for count in (1, 10, 30, 60):
+        page = fake_page(count)
+        benchmark(f"parse_fans[{count}]")(lambda page=page: measure(lambda: service.parse_fans(page, 90)))
+
+    for count in (1, 10):
+        rx = FakeRx(fake_page(count))
+        benchmark(f"list_fans[{count}]")(lambda rx=rx: measure(lambda: service.list_fans(rx, 90)))
+
+register_parse_benchmarks()
+
+@benchmark("build_data")
+def bench_build_data():
+    fan = service.parse_fans(fake_page(1), 90)[0]
+    return measure(lambda: (service.build_data(fan, 0), service.build_data(fan, 1)))
+
+@benchmark("temp_to_pwm")
+def bench_temp_to_pwm():
+    return measure(lambda: temp_to_pwm(61.3))
+
+@benchmark("approach_pwm")
+def bench_approach_pwm():
+    return measure(lambda: approach_pwm(80, 120, 4))
+
+@benchmark("control_tick")
+def bench_control_tick():
+    state = ControlState()
+    clock = [0.0]
+
+    def tick():
+        clock[0] += 1.0
+        target = state.target_pwm(40.0 + clock[0] % 30, clock[0])
+        state.step_pwm("bench", 80, target, clock[0])
+    return measure(tick)
+
+@benchmark("get_cpu_temp")
+def bench_get_cpu_temp():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_sysfs(root)
+        with fake_sysfs(root):
+            assert service.get_cpu_temp() is not None
+            return measure(service.get_cpu_temp)
+
+@benchmark("status_json_encode[10]")
+def bench_status_json_encode():
+    status = fake_status(10)
+    return measure(status.model_dump_json)
+
+@benchmark("status_json_decode[10]")
+def bench_status_json_decode():
+    raw = fake_status(10).model_dump_json()
+    return measure(lambda: SystemStatus.model_validate_json(raw))
+
+@benchmark("status_bin_encode[10]")
+def bench_status_bin_encode():
+    status = fake_status(10)
+    return measure(lambda: encode_status(status))
+
+@benchmark("status_bin_decode[10]")
+def bench_status_bin_decode():
+    raw = encode_status(fake_status(10))
+    return measure(lambda: decode_status(raw))
+
+def bench_uds(path: str):
+    service.update_state(52.5, fake_fans(10))
+    with uds_server() as sock:
+        with httpx.Client(transport=httpx.HTTPTransport(uds=sock)) as client:
+            client.get(f"http://localhost{path}").raise_for_status()
+            return measure(lambda: client.get(f"http://localhost{path}"))
+
+benchmark("uds_status")(lambda: bench_uds("/status"))
+benchmark("uds_status_bin")(lambda: bench_uds("/status.bin"))
+
+@benchmark("cli_cold_start")
+def bench_cli_cold_start():
+    cmd = [sys.executable, str(SRC_DIR / "cli.py"), "--help"]
+    runs = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+        runs.append((time.perf_counter() - start) * 1e9)
+    return summarize(runs)
+
+
+# Pairs of (faster, slower) benchmarks, the binary protocol only exists to beat JSON
+CHECKS = [
+    ("status_bin_encode[10]", "status_json_encode[10]"),
+    ("status_bin_decode[10]", "status_json_decode[10]"),
+]
+
+
+# ==============================
+# ENTRY
+# ==============================
+def format_ns(ns: float) -> str:
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} us"
+    return f"{ns:.0f} ns"
+
+def run(selected: str | None = None) -> dict:
+    results = {}
+    spread = {}
+    for name, fn in BENCHMARKS.items():
+        if selected and selected not in name:
+            continue
+        median, iqr = fn()
+        results[name] = round(median, 1)
+        spread[name] = round(iqr, 3)
+        print(f"{name:28} {format_ns(results[name]):>12} {f'±{iqr:.1%}':>8}")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "psutil": psutil.__version__,
+            "time": time.time(),
+        },
+        "results": results,
+        "spread": spread,
+    }
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    ok = True
+    print(f"{'Benchmark':28} {'Baseline':>12} {'Current':>12} {'Change':>8} {'Allowed':>8}")
+    print("-" * 73)
+    for name, now in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:28} {'-':>12} {format_ns(now):>12} {'new':>8}")
+            continue
+        # A benchmark that is noisy on either side gets that much more slack
+        allowed = threshold + baseline.get("spread", {}).get(name, 0.0) + current.get("spread", {}).get(name, 0.0)
+        change = (now - before) / before
+        flag = ""
+        if change > allowed:
+            flag = "  \033[91mREGRESSION\033[0m"
+            ok = False
+        print(f"{name:28} {format_ns(before):>12} {format_ns(now):>12} {change:>+8.1%} {allowed:>+8.1%}{flag}")
+    return ok
+
+def check(current: dict) -> bool:
+    ok = True
+    results = current["results"]
+    spread = current.get("spread", {})
+    for faster, slower in CHECKS:
+        if faster not in results or slower not in results:
+            continue
+        # Only fail when the gap is bigger than the noise of both runs
+        if results[faster] * (1 - spread.get(faster, 0.0)) >= results[slower] * (1 + spread.get(slower, 0.0)):
+            print(f"\033[91mFAIL\033[0m {faster} ({format_ns(results[faster])}) is not faster than {slower} ({format_ns(results[slower])})")
+            ok = False
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LL-Connect-Wireless benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("-k", dest="selected", help="only run benchmarks whose name contains this")
+    run_parser.add_argument("--out", help="write results to this json file")
+    run_parser.add_argument("--save", action="store_true", help="write the results into the committed baseline (only the selected ones with -k)")
+
+    cmp_parser = subparsers.add_parser("compare", help="run (or load) results and compare against the baseline")
+    cmp_parser.add_argument("-k", dest="selected", help="only run benchmarks whose name contains this")
+    cmp_parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    cmp_parser.add_argument("--current", help="compare this results file instead of running the benchmarks")
+    cmp_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown as a fraction, on top of the measured spread (default: 0.15)")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run(args.selected)
+        outputs = [(args.out, results)] if args.out else []
+        if args.save:
+            baseline = results
+            if args.selected and BASELINE_PATH.exists():
+                # Only refresh the benchmarks that ran, keep the rest of the baseline
+                with open(BASELINE_PATH) as f:
+                    baseline = json.load(f)
+                baseline["meta"] = results["meta"]
+                baseline["results"].update(results["results"])
+                baseline.setdefault("spread", {}).update(results["spread"])
+            outputs.append((str(BASELINE_PATH), baseline))
+        for path, data in outputs:
+            with open(path, "w") as f:
+                json.dump(data, f, indent=2)
+                f.write("\n")
+            print(f"Results written to {path}")
+        if not check(results):
+            sys.exit(1)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if args.current:
+            with open(args.current) as f:
+                current = json.load(f)
+        else:
+            current = run(args.selected)
+            print()
+        ok = compare(baseline, current, args.threshold)
+        if not check(current) or not ok:
+            sys.exit(1)
@@ -0,0 +1,96 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT_DIR = Path(os.path.realpath(__file__)).parent.parent
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from models import Fan, SystemStatus
+from protocol import encode_status
+from shm import MAX_FANS, StatusReader, StatusSegment
+
+# ==============================
+# SHM SEQLOCK TORTURE CHECK
+# ==============================
+# Several writers publish snapshots whose every field is derived from one mark,
+# while readers check that each snapshot they get back is internally consistent.
+
+def writer(path: str, writer_id: int, rounds: int):
+    seg = StatusSegment(path)
+    for i in range(rounds):
+        n = (i % MAX_FANS) + 1
+        mark = (writer_id * 64 + i) & 0xFFFF
+        fans = [
+            Fan(
+                mac=f"00:00:00:00:{writer_id:02x}:{j:02x}",
+                master_mac="00:00:00:00:00:00",
+                channel=writer_id,
+                rx_type=0,
+                fan_count=n % 10,
+                pwm=mark & 0xFF,
+                rpm=[mark] * 4,
+                target_pwm=mark & 0xFF,
+                is_bound=False
+            )
+            for j in range(n)
+        ]
+        seg.publish(encode_status(SystemStatus(timestamp=float(mark), cpu_temp=float(n), fans=fans)))
+    seg.close()
+
+def reader(path: str, stop, results):
+    reader = StatusReader(path)
+    reads = 0
+    try:
+        while not stop.is_set():
+            status = reader.read()
+            if status is None:
+                continue
+            mark = int(status.timestamp)
+            n = int(status.cpu_temp)
+            assert len(status.fans) == n, f"fan count {len(status.fans)} != {n}"
+            for f in status.fans:
+                assert f.rpm == (mark,) * 4, f"torn rpm {f.rpm} for mark {mark}"
+                assert f.pwm == mark & 0xFF and f.fan_count == n % 10
+                assert f.channel == status.fans[0].channel
+            reads += 1
+    finally:
+        reader.close()
+        results.put(reads)
+
+def torture(writers: int, readers: int, rounds: int) -> bool:
+    path = os.path.join(tempfile.mkdtemp(), "status.shm")
+    StatusSegment(path).close()
+
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    read_procs = [multiprocessing.Process(target=reader, args=(path, stop, results)) for _ in range(readers)]
+    write_procs = [multiprocessing.Process(target=writer, args=(path, w, rounds)) for w in range(writers)]
+    for p in read_procs + write_procs:
+        p.start()
+    for p in write_procs:
+        p.join()
+    stop.set()
+    reads = [results.get(timeout=10) for _ in read_procs]
+    for p in read_procs:
+        p.join()
+    os.unlink(path)
+
+    failed = [p for p in read_procs + write_procs if p.exitcode != 0]
+    if failed:
+        print(f"\033[91mFAIL\033[0m: {len(failed)} torture workers failed")
+        return False
+    print(f"OK: {writers} writers x {rounds} snapshots, {sum(reads)} consistent reads")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent writer/reader check of the shm status segment")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=5000)
+    args = parser.parse_args()
+
+    if not torture(args.writers, args.readers, args.rounds):
+        sys.exit(1)
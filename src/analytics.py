@@ -0,0 +1,128 @@
+import math
+from typing import Dict, List
+from models import Fan, FanHealth
+
+# ==============================
+# RPM ANALYTICS CONFIG
+# ==============================
+RPM_ALPHA = 0.2
+EXPECTED_ALPHA = 0.1
+
+# Expected RPM is learned per bucket of PWM values
+PWM_BUCKET_SHIFT = 4
+PWM_BUCKETS = 256 >> PWM_BUCKET_SHIFT
+EXPECTED_WARMUP = 5
+
+# Slots at 0 RPM above this PWM count as stalled, below it fans may legitimately stop
+STALL_MIN_PWM = 51
+STALL_TICKS = 2
+
+MISMATCH_RATIO = 0.35
+MISMATCH_TICKS = 2
+
+# A fault stays latched until the fan looks healthy again for this many ticks
+RECOVER_TICKS = 2
+
+# ==============================
+# PER FAN STATE
+# ==============================
+class FanStats:
+    def __init__(self):
+        self.rpm_avg = None
+        self.rpm_var = 0.0
+        self.expected = [0.0] * PWM_BUCKETS
+        self.expected_count = [0] * PWM_BUCKETS
+        self.stall_ticks = [0] * 4
+        self.mismatch_ticks = 0
+
+        # Latched fault, kept until the fan recovers relative to the bucket it was detected in
+        self.fault_bucket = None
+        self.fault_stalled: List[int] = []
+        self.fault_mismatch = False
+        self.recover_ticks = 0
+
+    def update(self, pwm: int, rpm: List[int]) -> FanHealth:
+        bucket = (pwm & 0xFF) >> PWM_BUCKET_SHIFT
+        mean = sum(rpm) / len(rpm) if rpm else 0.0
+
+        if self.rpm_avg is None:
+            self.rpm_avg = mean
+        else:
+            diff = mean - self.rpm_avg
+            self.rpm_avg += RPM_ALPHA * diff
+            self.rpm_var = (1 - RPM_ALPHA) * (self.rpm_var + RPM_ALPHA * diff * diff)
+
+        stalled = []
+        for i, r in enumerate(rpm):
+            if r == 0 and pwm >= STALL_MIN_PWM:
+                self.stall_ticks[i] += 1
+            else:
+                self.stall_ticks[i] = 0
+            if self.stall_ticks[i] >= STALL_TICKS:
+                stalled.append(i)
+
+        learned = self.expected_count[bucket] >= EXPECTED_WARMUP
+        expected = self.expected[bucket] if learned else None
+        if expected and abs(mean - expected) > MISMATCH_RATIO * expected:
+            self.mismatch_ticks += 1
+        else:
+            self.mismatch_ticks = 0
+        mismatch = self.mismatch_ticks >= MISMATCH_TICKS
+
+        if stalled or mismatch:
+            if self.fault_bucket is None:
+                self.fault_bucket = bucket
+            self.fault_stalled = sorted(set(self.fault_stalled).union(stalled))
+            self.fault_mismatch = self.fault_mismatch or mismatch
+            self.recover_ticks = 0
+        elif self.fault_bucket is not None:
+            self.recover_ticks = self.recover_ticks + 1 if self.recovered(bucket, mean) else 0
+            if self.recover_ticks >= RECOVER_TICKS:
+                self.fault_bucket = None
+                self.fault_stalled = []
+                self.fault_mismatch = False
+                self.recover_ticks = 0
+
+        # Only learn from readings that look healthy so a failing fan doesn't become the norm.
+        # That includes every reading while a fault is latched, the fan may be boosted into a
+        # bucket it has never been seen in and would otherwise teach it the degraded RPM.
+        if self.fault_bucket is None and not any(self.stall_ticks) and self.mismatch_ticks == 0:
+            if self.expected_count[bucket] == 0:
+                self.expected[bucket] = mean
+            else:
+                self.expected[bucket] += EXPECTED_ALPHA * (mean - self.expected[bucket])
+            self.expected_count[bucket] += 1
+
+        return FanHealth(
+            rpm_avg=round(self.rpm_avg),
+            rpm_std=round(math.sqrt(self.rpm_var)),
+            expected_rpm=round(expected) if expected is not None else None,
+            stalled=self.fault_stalled,
+            mismatch=self.fault_mismatch
+        )
+
+    def recovered(self, bucket: int, mean: float) -> bool:
+        if any(self.stall_ticks):
+            return False
+        if self.expected_count[self.fault_bucket] < EXPECTED_WARMUP:
+            return True
+        expected = self.expected[self.fault_bucket]
+        if bucket == self.fault_bucket:
+            return abs(mean - expected) <= MISMATCH_RATIO * expected
+        # Driven harder than when the fault showed up (e.g. boosted), it should spin at least as fast
+        return bucket > self.fault_bucket and mean >= (1 - MISMATCH_RATIO) * expected
+
+
+class FanAnalytics:
+    def __init__(self):
+        self.stats: Dict[str, FanStats] = {}
+
+    def update(self, fan: Fan) -> FanHealth:
+        stats = self.stats.get(fan.mac)
+        if stats is None:
+            stats = self.stats[fan.mac] = FanStats()
+
+        count = fan.fan_count or len(fan.rpm)
+        health = stats.update(fan.pwm, fan.rpm[:count])
+        fan.health = health
+        return health
@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import math
+import mmap
+import struct
+import sys
+import time
+from typing import Iterator, List, Tuple
+
+# ==============================
+# USB CAPTURE FORMAT
+# ==============================
+# Layout (little endian):
+#   header: magic(8s) version(u16) pad(6) start_wall(f64)
+#   record: kind(u8) t_ns(u64, monotonic since start) length(u32) | payload
+#
+# Records are appended back to back, so a capture can be mmap'd and walked
+# by offset without parsing anything but the fixed record header.
+#
+# Tick records hold the control clock and CPU temperature (NaN = None) the
+# loop used for that tick, so the loop itself can be replayed.
+#
+# The file is only ever appended to. Every recorder start (i.e. every daemon
+# start) writes a start record, and t_ns keeps counting from the first start.
+
+CAPTURE_MAGIC = b"LLCWUSB\0"
+CAPTURE_VERSION = 1
+
+FILE_HEADER = struct.Struct("<8sH6xd")
+RECORD = struct.Struct("<BQI")
+
+TICK = struct.Struct("<dd")
+
+KIND_PAGE = 0
+KIND_FRAME = 1
+KIND_TICK = 2
+KIND_START = 3
+
+USB_CHUNK = 512
+
+
+class Recorder:
+    def __init__(self, path: str):
+        self.path = path
+        self.f = open(path, "ab")
+        if self.f.tell() < FILE_HEADER.size:
+            start_wall = time.time()
+            self.f.truncate(0)
+            self.f.write(FILE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, start_wall))
+        else:
+            # Continue the capture of an earlier run, e.g. the one that crashed before a restart
+            with open(path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ) as mm:
+                    magic, version, start_wall = FILE_HEADER.unpack_from(mm, 0)
+                    if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+                        self.f.close()
+                        raise ValueError(f"{path} is not a capture that can be appended to")
+                    end = capture_end(mm)
+            # Drop a record cut short by the crash
+            self.f.truncate(end)
+
+        # Monotonic clocks don't carry over between runs, line them up through the wall clock
+        self.start = time.monotonic_ns() - int((time.time() - start_wall) * 1e9)
+        self._append(KIND_START, b"")
+
+    def _append(self, kind: int, data: bytes):
+        self.f.write(RECORD.pack(kind, time.monotonic_ns() - self.start, len(data)))
+        self.f.write(data)
+        self.f.flush()
+
+    def page(self, payload: bytes):
+        self._append(KIND_PAGE, payload)
+
+    def frame(self, frame: bytes):
+        self._append(KIND_FRAME, frame)
+
+    def tick(self, now: float, temp: float | None):
+        self._append(KIND_TICK, TICK.pack(now, math.nan if temp is None else temp))
+
+    def close(self):
+        self.f.close()
+
+
+def iter_records(buf) -> Iterator[Tuple[int, int, memoryview]]:
+    magic, version, _ = FILE_HEADER.unpack_from(buf, 0)
+    if magic != CAPTURE_MAGIC:
+        raise ValueError(f"Bad capture magic: {magic!r}")
+    if version != CAPTURE_VERSION:
+        raise ValueError(f"Unsupported capture version: {version}")
+
+    view = memoryview(buf)
+    offset = FILE_HEADER.size
+    while offset + RECORD.size <= len(buf):
+        kind, t_ns, length = RECORD.unpack_from(buf, offset)
+        offset += RECORD.size
+        if offset + length > len(buf):
+            # Truncated tail from an interrupted recording
+            break
+        yield kind, t_ns, view[offset:offset + length]
+        offset += length
+
+def capture_end(buf) -> int:
+    offset = FILE_HEADER.size
+    while offset + RECORD.size <= len(buf):
+        _, _, length = RECORD.unpack_from(buf, offset)
+        if offset + RECORD.size + length > len(buf):
+            break
+        offset += RECORD.size + length
+    return offset
+
+def load_capture(path: str) -> List[Tuple[int, int, bytes]]:
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ) as mm:
+            return [(kind, t_ns, bytes(data)) for kind, t_ns, data in iter_records(mm)]
+
+
+def load_sessions(path: str) -> List[List[Tuple[int, int, bytes]]]:
+    # One list of records per daemon run, records before the first start record count as a run
+    sessions = [[]]
+    for record in load_capture(path):
+        if record[0] == KIND_START:
+            sessions.append([])
+        else:
+            sessions[-1].append(record)
+    return [s for s in sessions if s]
+
+
+# ==============================
+# REPLAY BACKEND
+# ==============================
+# Stands in for the RX device and serves recorded pages to fetch_page
+class ReplayRx:
+    def __init__(self, records: List[Tuple[int, int, bytes]], realtime: bool = False, loop: bool = False, since_ns: int = 0):
+        self.pages = [(t_ns, data) for kind, t_ns, data in records if kind == KIND_PAGE and t_ns >= since_ns]
+        self.realtime = realtime
+        self.loop = loop
+        self.index = 0
+        self.pending = b""
+        self.start = None
+
+    def write(self, endpoint, data, timeout=None):
+        if self.index >= len(self.pages):
+            if not self.loop or not self.pages:
+                raise EOFError("End of capture")
+            self.index = 0
+            self.start = None
+
+        t_ns, page = self.pages[self.index]
+        self.index += 1
+
+        if self.realtime:
+            now = time.monotonic_ns()
+            if self.start is None:
+                self.start = now - t_ns
+            delay = (self.start + t_ns - now) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+
+        self.pending = page
+        return len(data)
+
+    def read(self, endpoint, size, timeout=None):
+        chunk = self.pending[:min(size, USB_CHUNK)]
+        self.pending = self.pending[len(chunk):]
+        return chunk
+
+
+# Stands in for the TX device and keeps every frame written to it
+class ReplayTx:
+    def __init__(self):
+        self.frames: List[bytes] = []
+
+    def write(self, endpoint, data, timeout=None):
+        self.frames.append(bytes(data))
+        return len(data)
+
+
+# Stands in for the clock and CPU sensor of the control loop, one recorded tick per call
+class ReplayTicks:
+    def __init__(self, records: List[Tuple[int, int, bytes]]):
+        self.ticks = [(t_ns, *TICK.unpack(data)) for kind, t_ns, data in records if kind == KIND_TICK]
+        self.start_ns = self.ticks[0][0] if self.ticks else 0
+        self.index = 0
+        self.temp = None
+
+    def clock(self) -> float:
+        _, now, temp = self.ticks[self.index]
+        self.index += 1
+        self.temp = None if math.isnan(temp) else temp
+        return now
+
+    def cpu_temp(self) -> float | None:
+        return self.temp
+
+
+async def replay_sleep(deadline: float) -> float:
+    await asyncio.sleep(0)
+    return 0.0
+
+async def replay_session(records: List[Tuple[int, int, bytes]]) -> Tuple[List[bytes], List[bytes]]:
+    from service import fan_control_loop
+
+    ticks = ReplayTicks(records)
+    rx = ReplayRx(records, since_ns=ticks.start_ns)
+    tx = ReplayTx()
+    recorded = [data for kind, t_ns, data in records if kind == KIND_FRAME]
+
+    # The loop prints its table every tick
+    with contextlib.redirect_stdout(io.StringIO()):
+        await fan_control_loop(
+            rx, tx,
+            clock=ticks.clock,
+            read_temp=ticks.cpu_temp,
+            sleep=replay_sleep,
+            max_ticks=len(ticks.ticks)
+        )
+    return recorded, tx.frames
+
+async def replay_control(path: str) -> List[Tuple[List[bytes], List[bytes]]]:
+    # Every daemon run starts with a fresh control state, so each is replayed on its own
+    return [await replay_session(records) for records in load_sessions(path)]
+
+
+# ==============================
+# ENTRY
+# ==============================
+def summarize(path: str):
+    records = load_capture(path)
+    pages = [r for r in records if r[0] == KIND_PAGE]
+    frames = [r for r in records if r[0] == KIND_FRAME]
+    ticks = [r for r in records if r[0] == KIND_TICK]
+    starts = [r for r in records if r[0] == KIND_START]
+    span = (records[-1][1] - records[0][1]) / 1e9 if records else 0.0
+    print(f"{path}: {max(len(starts), 1)} runs, {len(ticks)} ticks, {len(pages)} pages, {len(frames)} frames over {span:.1f}s")
+
+def replay(path: str, realtime: bool):
+    from service import list_fans
+
+    rx = ReplayRx(load_capture(path), realtime=realtime)
+    pages = len(rx.pages)
+    fans = 0
+    start = time.perf_counter()
+    for _ in range(pages):
+        fans += len(list_fans(rx, 0))
+    elapsed = time.perf_counter() - start
+
+    rate = pages / elapsed if elapsed > 0 else float("inf")
+    print(f"Replayed {pages} pages ({fans} fan records) in {elapsed:.3f}s ({rate:.0f} pages/s)")
+
+def replay_loop(path: str) -> bool:
+    sessions = asyncio.run(replay_control(path))
+    for run, (recorded, replayed) in enumerate(sessions, 1):
+        # A recording stopped mid-tick misses the tail of that tick's frames
+        for i, (want, got) in enumerate(zip(recorded, replayed)):
+            if want != got:
+                print(f"Run {run}, frame {i} differs:\n  recorded {want.hex()}\n  replayed {got.hex()}")
+                return False
+        if len(replayed) < len(recorded):
+            print(f"Run {run}: control loop sent {len(replayed)} frames, capture has {len(recorded)}")
+            return False
+    total = sum(len(recorded) for recorded, _ in sessions)
+    print(f"Control loop reproduced all {total} recorded frames over {len(sessions)} runs")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or replay a USB capture")
+    parser.add_argument("capture")
+    parser.add_argument("--replay", action="store_true", help="feed recorded pages through list_fans")
+    parser.add_argument("--realtime", action="store_true", help="replay at the original speed instead of as fast as possible")
+    parser.add_argument("--control", action="store_true", help="run the recorded ticks through the control loop and compare the frames it sends")
+    args = parser.parse_args()
+
+    summarize(args.capture)
+    if args.replay:
+        replay(args.capture, args.realtime)
+    if args.control and not replay_loop(args.capture):
+        sys.exit(1)
@@ -1,29 +1,51 @@
 import sys
 import time
+import asyncio
 import argparse
 import subprocess
+from pathlib import Path
 import httpx
-from utils import SOCKET_PATH, get_build_identity
-from models import SystemStatus, VersionInfo, VersionStatus
+from pydantic import ValidationError
+from utils import SOCKET_PATH, UPDATE_CACHE_DIR, get_build_identity
+from models import Curve, VersionInfo, VersionStatus
+from protocol import FanHealthView, StatusView, decode_status
+from shm import SHM_PATH, StatusReader
+from control import tick_length
+from updates import VerifyError, cache_path, download, prune, resolve_digest
+from simulate import SYNTHETIC_TRACES, load_trace, print_result, simulate, synthetic_trace, write_csv
 from vars import APP_RAW_VERSION, APP_NAME, APP_ALIAS
 
+# A snapshot older than this many control ticks is left over from a stopped daemon
+STALE_TICKS = 3
+
 def clear_console():
     sys.stdout.write("\033[H\033[J")
     sys.stdout.flush()
 
-def fetch_state() -> SystemStatus:
+def fetch_state_bin() -> StatusView:
     transport = httpx.HTTPTransport(uds=SOCKET_PATH)
     with httpx.Client(transport=transport) as client:
-        resp = client.get("http://localhost/status")
+        resp = client.get("http://localhost/status.bin")
         resp.raise_for_status()
-        return SystemStatus(**resp.json())
+        return decode_status(resp.content)
+
+def health_label(health: FanHealthView | None) -> str:
+    if health is None:
+        return "-"
+    if health.stalled:
+        label = "STALL " + "".join(str(i + 1) for i in health.stalled)
+    elif health.mismatch:
+        label = "MISMATCH"
+    else:
+        return "ok"
+    return label + ("!" if health.boosted else "")
 
-def render(status: SystemStatus):
+def render(status: StatusView):
     clear_console()
     print(f"LL-Connect-Wireless Monitor\n\n")
 
     print(f"CPU Temp: {status.cpu_temp:.1f} °C\n")
-    print(f"{'Fan Address':17} | Fans | Cur % | Tgt % | RPM")
+    print(f"{'Fan Address':17} | Fans | Cur % | Tgt % | Health   | RPM")
     print("-" * 72)
 
     for f in status.fans:
@@ -36,14 +58,27 @@ def render(status: SystemStatus):
             f"{f.fan_count:>4} | "
             f"{cur_pct:>5}% | "
             f"{tgt_pct:>5}% | "
+            f"{health_label(f.health):8} | "
             f"{rpm}"
         )
 
+def open_status_reader() -> StatusReader | None:
+    try:
+        return StatusReader(SHM_PATH)
+    except (OSError, ValueError):
+        return None
+
 def run_monitor():
     err = 0
+    reader = open_status_reader()
     while True:
         try:
-            state = fetch_state()
+            state = reader.read() if reader else None
+            if state is None or time.time() - state.timestamp > STALE_TICKS * tick_length(len(state.fans)):
+                # Segment missing or left behind by a stopped daemon; fall back to the socket
+                if reader: reader.close()
+                reader = open_status_reader()
+                state = fetch_state_bin()
             render(state)
             err = 0
         except Exception as e:
@@ -69,7 +104,7 @@ def run_systemctl(action: str):
         print("Error: 'systemctl' command not found. Are you sure you are using in Linux?")
         sys.exit(1)
 
-def run_info(remote_ver: VersionStatus | False):
+def run_info(remote_ver: VersionStatus | bool):
     try:
         print("\033[1mLL-Connect-Wireless Information\033[0m")
         print("-" * 30)
@@ -87,7 +122,27 @@ def run_info(remote_ver: VersionStatus | False):
     except Exception as e:
         print(f"Could not connect to daemon: {e}")
 
-def run_update(remote_ver: VersionStatus | False):
+async def fetch_installer(ver: VersionInfo, dest: Path) -> str | None:
+    async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
+        digest = await resolve_digest(client, ver)
+        if not digest:
+            return None
+
+        try:
+            # The daemon may have prefetched it already, the digest is checked again on this side
+            transport = httpx.AsyncHTTPTransport(uds=SOCKET_PATH)
+            async with httpx.AsyncClient(transport=transport, timeout=30.0) as daemon:
+                await download(daemon, f"http://localhost/update/installer/{ver.raw_tag}", dest, digest)
+            print("\nUsing installer prefetched by the daemon")
+            return digest
+        except (httpx.HTTPError, VerifyError):
+            pass
+
+        print(f"\nDownloading {ver.installer_url}...")
+        await download(client, ver.installer_url, dest, digest)
+        return digest
+
+def run_update(remote_ver: VersionStatus | bool):
     if not remote_ver:
         print("Could not retrieve version information from the daemon.")
         return
@@ -107,9 +162,10 @@ def run_update(remote_ver: VersionStatus | False):
         print("\033[91mNo compatible installer found for your specific system architecture/distro.\033[0m")
         return
 
-    tmp_path = f"/tmp/llcw_update{ext}"
+    ver = remote_ver.data
+    tmp_path = cache_path(UPDATE_CACHE_DIR, ver)
 
-    print(f"\n\033[1mUpdate Found: {remote_ver.data.raw_tag}\033[0m")
+    print(f"\n\033[1mUpdate Found: {ver.raw_tag}\033[0m")
     print(f"Download URL: {url}")
     print(f"Target Path:  {tmp_path}")
     print("-" * 40)
@@ -119,21 +175,20 @@ def run_update(remote_ver: VersionStatus | False):
         print("Update cancelled.")
         return
 
-    print(f"\nDownloading {url}...")
     try:
-        with httpx.Client(follow_redirects=True) as client:
-            with client.stream("GET", url) as response:
-                response.raise_for_status()
-                with open(tmp_path, "wb") as f:
-                    for chunk in response.iter_bytes():
-                        f.write(chunk)
+        digest = asyncio.run(fetch_installer(ver, tmp_path))
+        if not digest:
+            print("\033[91mNo published checksum found for this installer, refusing to install it unverified.\033[0m")
+            print(f"You can download it manually from: {url}")
+            return
+        prune(UPDATE_CACHE_DIR, ver.raw_tag)
         
-        print("Download complete. Starting installation...")
+        print(f"Download complete, checksum verified ({digest}). Starting installation...")
         
         if ext == ".rpm":
-            subprocess.run(["sudo", "dnf", "install", "-y", tmp_path], check=True)
+            subprocess.run(["sudo", "dnf", "install", "-y", str(tmp_path)], check=True)
         elif ext == ".deb":
-            subprocess.run(["sudo", "apt", "install", "-y", tmp_path], check=True)
+            subprocess.run(["sudo", "apt", "install", "-y", str(tmp_path)], check=True)
         else:
             print(f"\033[93mAutomatic installation not supported for {ext}.\033[0m")
             print(f"Please install the file manually from: {tmp_path}")
@@ -142,11 +197,46 @@ def run_update(remote_ver: VersionStatus | False):
 
     except httpx.HTTPError as e:
         print(f"\033[91mDownload failed: {e}\033[0m")
+        print("Run 'llcw update' again to resume the download.")
+    except VerifyError as e:
+        print(f"\033[91mVerification failed: {e}\033[0m")
     except subprocess.CalledProcessError as e:
         print(f"\033[91mInstallation failed: {e}\033[0m")
     except Exception as e:
         print(f"\033[91mAn unexpected error occurred: {e}\033[0m")
 
+def run_simulate(args: argparse.Namespace):
+    try:
+        curve = Curve(**{
+            name: getattr(args, name)
+            for name in Curve.model_fields
+            if getattr(args, name) is not None
+        })
+    except ValidationError as e:
+        error = e.errors()[0]
+        field = f"--{error['loc'][0].replace('_', '-')}: " if error["loc"] else ""
+        print(f"\033[91mInvalid curve: {field}{error['msg']}\033[0m")
+        sys.exit(1)
+
+    try:
+        if args.trace:
+            trace = load_trace(args.trace, args.interval)
+        else:
+            trace = synthetic_trace(args.synthetic, args.duration, args.interval, args.noise)
+    except (OSError, ValueError) as e:
+        print(f"\033[91mCould not load temperature trace: {e}\033[0m")
+        sys.exit(1)
+
+    try:
+        result = simulate(trace, curve, args.devices, args.start_pwm)
+    except ValueError as e:
+        print(f"\033[91mInvalid simulation: {e}\033[0m")
+        sys.exit(1)
+    print_result(result, curve)
+    if args.csv:
+        write_csv(result, args.csv)
+        print(f"Trajectory written to {args.csv}")
+
 def check_update():
     try:
         transport = httpx.HTTPTransport(uds=SOCKET_PATH)
@@ -195,8 +285,24 @@ if __name__ == "__main__":
         
         subparsers.add_parser("monitor", help="show live fan monitor (Default to it if no command is provided)")
 
+        sim_parser = subparsers.add_parser("simulate", help="run the fan curve against a temperature trace offline")
+        sim_parser.add_argument("--trace", help="temperature trace file, one 'seconds,temp' or 'temp' per line")
+        sim_parser.add_argument("--synthetic", choices=SYNTHETIC_TRACES, default="step", help="synthetic trace used when --trace is not given")
+        sim_parser.add_argument("--duration", type=float, default=600.0, help="length of the synthetic trace in seconds")
+        sim_parser.add_argument("--interval", type=float, default=1.0, help="seconds between samples without a time column")
+        sim_parser.add_argument("--noise", type=float, default=0.0, help="stddev of gaussian noise added to the synthetic trace")
+        sim_parser.add_argument("--devices", type=int, default=1, help="number of wireless devices, affects tick length and frames")
+        sim_parser.add_argument("--start-pwm", type=int, help="initial fan pwm (default: curve min pwm)")
+        sim_parser.add_argument("--csv", help="write the pwm trajectory to this csv file")
+        for name, field in Curve.model_fields.items():
+            sim_parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=field.annotation, help=f"curve override (default: {field.default})")
+
         args = parser.parse_args()
 
+        if args.command == "simulate":
+            run_simulate(args)
+            sys.exit(0)
+
         is_monitor = args.command == "monitor" or args.command is None
         remoteVer = check_update()
         if (remoteVer and remoteVer.outdated and not remoteVer.notified and not args.command == "info" and not args.command == "update"):
@@ -0,0 +1,73 @@
+import math
+from typing import Dict
+from models import Curve
+
+# ==============================
+# USER CONFIG
+# ==============================
+DEFAULT_CURVE = Curve()
+
+MIN_PWM = DEFAULT_CURVE.min_pwm
+MAX_PWM = DEFAULT_CURVE.max_pwm
+
+MIN_TEMP = DEFAULT_CURVE.min_temp
+MAX_TEMP = DEFAULT_CURVE.max_temp
+
+DAMPING_SECOND = DEFAULT_CURVE.damping_second
+DAMPING_TEMP   = DEFAULT_CURVE.damping_temp
+
+PWM_STEP = DEFAULT_CURVE.pwm_step
+PWM_STEP_INTERVAL = DEFAULT_CURVE.pwm_step_interval
+
+# Pause after writing the frames of one device, and between loop ticks
+FAN_WRITE_INTERVAL = 0.5
+LOOP_INTERVAL  = 0.5
+
+def tick_length(devices: int) -> float:
+    return devices * FAN_WRITE_INTERVAL + LOOP_INTERVAL
+
+# ==============================
+# TEMP → PWM
+# ==============================
+def clamp(v, lo, hi):
+    return max(lo, min(hi, v))
+
+def temp_to_pwm(temp, curve: Curve = DEFAULT_CURVE):
+    t = clamp(temp, curve.min_temp, curve.max_temp)
+    ratio = (t - curve.min_temp) / (curve.max_temp - curve.min_temp)
+    return int(curve.min_pwm + ratio * (curve.max_pwm - curve.min_pwm))
+
+def approach_pwm(current, target, step):
+    if current < target:
+        return min(current + step, target)
+    elif current > target:
+        return max(current - step, target)
+    return current
+
+# ==============================
+# DAMPING
+# ==============================
+class ControlState:
+    def __init__(self, curve: Curve = DEFAULT_CURVE):
+        self.curve = curve
+        self.last_temp = None
+        # -inf so the first update/step happens right away, whatever the clock starts at
+        self.last_target_update = -math.inf
+        self.last_pwm_step_time: Dict[str, float] = {}
+
+    def target_pwm(self, temp, now):
+        curve = self.curve
+        if (
+            self.last_temp is None or
+            abs(temp - self.last_temp) >= curve.damping_temp and
+            now - self.last_target_update >= curve.damping_second
+        ):
+            self.last_temp = temp
+            self.last_target_update = now
+        return temp_to_pwm(self.last_temp, curve)
+
+    def step_pwm(self, mac: str, pwm, target, now):
+        if now - self.last_pwm_step_time.get(mac, -math.inf) >= self.curve.pwm_step_interval:
+            self.last_pwm_step_time[mac] = now
+            return approach_pwm(pwm, target, self.curve.pwm_step)
+        return pwm
@@ -1,8 +1,16 @@
 
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
 
+class FanHealth(BaseModel):
+    rpm_avg: int
+    rpm_std: int
+    expected_rpm: Optional[int] = None
+    stalled: List[int] = []
+    mismatch: bool = False
+    boosted: bool = False
+
 class Fan(BaseModel):
     mac: str
     master_mac: str
@@ -13,12 +21,31 @@ class Fan(BaseModel):
     rpm: List[int]
     target_pwm: int
     is_bound: bool
+    health: Optional[FanHealth] = None
+
+    # mac + master_mac as read from the controller, lets the binary encoder skip parsing the strings
+    raw_macs: Optional[bytes] = Field(default=None, exclude=True, repr=False)
 
 class SystemStatus(BaseModel):
     timestamp: float
     cpu_temp: Optional[float] = None
     fans: List[Fan]
 
+class TickTiming(BaseModel):
+    ticks: int = 0
+    period_ms: float = 0.0
+    lateness_ms: float = 0.0
+    lateness_avg_ms: float = 0.0
+    lateness_max_ms: float = 0.0
+
+    def record(self, period: float, lateness: float):
+        lateness_ms = lateness * 1000
+        self.ticks += 1
+        self.period_ms = period * 1000
+        self.lateness_ms = lateness_ms
+        self.lateness_avg_ms += (lateness_ms - self.lateness_avg_ms) / min(self.ticks, 100)
+        self.lateness_max_ms = max(self.lateness_max_ms, lateness_ms)
+
 class VersionInfo(BaseModel):
     semver: str
     rc: int
@@ -27,8 +54,29 @@ class VersionInfo(BaseModel):
     raw_tag: str
     release_note: str | None
     installer_url: str | None
+    installer_name: str | None = None
+    installer_digest: str | None = None
+    checksums_url: str | None = None
 
 class VersionStatus(BaseModel):
     data: VersionInfo
     notified: bool
-    outdated: bool
\ No newline at end of file
+    outdated: bool
+
+class Curve(BaseModel):
+    min_pwm: int = Field(default=20, ge=0, le=255)
+    max_pwm: int = Field(default=175, ge=0, le=255)
+    min_temp: float = 35.0
+    max_temp: float = 85.0
+    damping_second: float = 2.0
+    damping_temp: float = 1.0
+    pwm_step: int = Field(default=4, gt=0)
+    pwm_step_interval: float = Field(default=0.5, ge=0)
+
+    @model_validator(mode="after")
+    def check_temp_range(self):
+        if self.max_temp <= self.min_temp:
+            raise ValueError("max_temp must be greater than min_temp")
+        if self.max_pwm < self.min_pwm:
+            raise ValueError("max_pwm must not be less than min_pwm")
+        return self
@@ -4,7 +4,7 @@ from datetime import datetime
 
 from models import VersionInfo
 
-def extractVersion(raw_tag: str, release_note: str | None = None, installer_url: str | None = None):
+def extractVersion(raw_tag: str, release_note: str | None = None, installer_url: str | None = None, installer_name: str | None = None, installer_digest: str | None = None, checksums_url: str | None = None):
     release_num = 1
     rc_num = 0
     
@@ -24,7 +24,7 @@ def extractVersion(raw_tag: str, release_note: str | None = None, installer_url:
         version_attr = f"{version_base}~rc{rc_num}"
     else:
         version_attr = version_base
-    return VersionInfo(semver=version_base, rc=rc_num, release=release_num, compile_ver=version_attr, raw_tag=raw_tag, release_note=release_note, installer_url=installer_url)
+    return VersionInfo(semver=version_base, rc=rc_num, release=release_num, compile_ver=version_attr, raw_tag=raw_tag, release_note=release_note, installer_url=installer_url, installer_name=installer_name, installer_digest=installer_digest, checksums_url=checksums_url)
 
 def main():
     parser = argparse.ArgumentParser()
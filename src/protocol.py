@@ -0,0 +1,165 @@
+import math
+import struct
+from typing import List, NamedTuple, Optional, Tuple
+from models import Fan, FanHealth, SystemStatus
+
+# ==============================
+# BINARY STATUS PROTOCOL
+# ==============================
+# Layout (little endian):
+#   header: magic(4s) schema(u16) timestamp(f64) cpu_temp(f32, NaN = None) fan_count(u16)
+#   fan:    mac(6s) master_mac(6s) channel(u8) rx_type(u8) fan_count(u8)
+#           pwm(u8) target_pwm(u8) is_bound(u8) rpm(4 x u16)
+#           rpm_avg(u16) rpm_std(u16) expected_rpm(u16, 0 = unknown) health_flags(u8)
+#
+# health_flags: bits 0-3 stalled slots, bit 4 mismatch, bit 5 boosted, bit 7 health present
+#
+# Both MACs are packed as one 12 byte field, which is the order they come in from
+# the controller record (see Fan.raw_macs).
+
+STATUS_MAGIC = b"LLCW"
+STATUS_SCHEMA = 2
+STATUS_MEDIA_TYPE = "application/vnd.llcw.status"
+
+HEADER = struct.Struct("<4sHdfH")
+FAN = struct.Struct("<12sBBBBB?4HHHHB")
+RPM_SLOTS = 4
+
+HEALTH_MISMATCH = 0x10
+HEALTH_BOOSTED = 0x20
+HEALTH_PRESENT = 0x80
+
+NO_HEALTH = (0, 0, 0, 0)
+STALLED_SLOTS = [tuple(i for i in range(RPM_SLOTS) if flags & (1 << i)) for flags in range(1 << RPM_SLOTS)]
+
+
+# ==============================
+# DECODED VIEWS
+# ==============================
+# decode_status returns plain tuples, clients only need the fields
+
+class FanHealthView(NamedTuple):
+    rpm_avg: int
+    rpm_std: int
+    expected_rpm: Optional[int]
+    stalled: Tuple[int, ...]
+    mismatch: bool
+    boosted: bool
+
+class FanView(NamedTuple):
+    mac: str
+    master_mac: str
+    channel: int
+    rx_type: int
+    fan_count: int
+    pwm: int
+    rpm: Tuple[int, ...]
+    target_pwm: int
+    is_bound: bool
+    health: Optional[FanHealthView]
+
+class StatusView(NamedTuple):
+    timestamp: float
+    cpu_temp: Optional[float]
+    fans: List[FanView]
+
+
+def mac_to_raw(mac: str) -> bytes:
+    return bytes.fromhex(mac.replace(":", ""))
+
+def raw_to_mac(raw: bytes) -> str:
+    return raw.hex(":")
+
+def fan_raw_macs(fan: Fan) -> bytes:
+    raw = fan.raw_macs
+    if raw is None:
+        raw = mac_to_raw(fan.mac) + mac_to_raw(fan.master_mac)
+    return raw
+
+def encode_health(health: FanHealth | None):
+    if health is None:
+        return NO_HEALTH
+    flags = HEALTH_PRESENT
+    if health.mismatch:
+        flags |= HEALTH_MISMATCH
+    if health.boosted:
+        flags |= HEALTH_BOOSTED
+    for slot in health.stalled:
+        flags |= 1 << slot
+    # Averages of u16 readings always fit in u16
+    return health.rpm_avg, health.rpm_std, health.expected_rpm or 0, flags
+
+def decode_health(rpm_avg: int, rpm_std: int, expected_rpm: int, flags: int) -> FanHealthView | None:
+    if not flags & HEALTH_PRESENT:
+        return None
+    return FanHealthView(
+        rpm_avg,
+        rpm_std,
+        expected_rpm or None,
+        STALLED_SLOTS[flags & 0xF],
+        bool(flags & HEALTH_MISMATCH),
+        bool(flags & HEALTH_BOOSTED)
+    )
+
+def encode_status(status: SystemStatus) -> bytes:
+    fans = status.fans
+    temp = math.nan if status.cpu_temp is None else status.cpu_temp
+    buf = bytearray(HEADER.size + FAN.size * len(fans))
+    HEADER.pack_into(buf, 0, STATUS_MAGIC, STATUS_SCHEMA, status.timestamp, temp, len(fans))
+
+    pack_into = FAN.pack_into
+    offset = HEADER.size
+    for f in fans:
+        rpm = f.rpm
+        if len(rpm) != RPM_SLOTS:
+            rpm = (list(rpm) + [0] * RPM_SLOTS)[:RPM_SLOTS]
+        pack_into(
+            buf, offset,
+            fan_raw_macs(f),
+            f.channel,
+            f.rx_type,
+            f.fan_count,
+            f.pwm,
+            f.target_pwm,
+            f.is_bound,
+            *rpm,
+            *encode_health(f.health)
+        )
+        offset += FAN.size
+    return bytes(buf)
+
+def truncate_status(payload: bytes, max_fans: int) -> bytes:
+    magic, schema, timestamp, temp, count = HEADER.unpack_from(payload, 0)
+    if count <= max_fans:
+        return payload
+    return HEADER.pack(magic, schema, timestamp, temp, max_fans) + payload[HEADER.size:HEADER.size + FAN.size * max_fans]
+
+def decode_status(buf: bytes) -> StatusView:
+    if len(buf) < HEADER.size:
+        raise ValueError("Status payload too short")
+    magic, schema, timestamp, temp, count = HEADER.unpack_from(buf, 0)
+    if magic != STATUS_MAGIC:
+        raise ValueError(f"Bad status magic: {magic!r}")
+    if schema != STATUS_SCHEMA:
+        raise ValueError(f"Unsupported status schema: {schema}")
+    end = HEADER.size + FAN.size * count
+    if len(buf) < end:
+        raise ValueError("Status payload truncated")
+
+    fans: List[FanView] = []
+    for macs, channel, rx_type, fan_count, pwm, target_pwm, is_bound, r0, r1, r2, r3, rpm_avg, rpm_std, expected_rpm, flags \
+            in FAN.iter_unpack(memoryview(buf)[HEADER.size:end]):
+        fans.append(FanView(
+            macs[:6].hex(":"),
+            macs[6:].hex(":"),
+            channel,
+            rx_type,
+            fan_count,
+            pwm,
+            (r0, r1, r2, r3),
+            target_pwm,
+            is_bound,
+            decode_health(rpm_avg, rpm_std, expected_rpm, flags) if flags else None
+        ))
+
+    return StatusView(timestamp, None if math.isnan(temp) else temp, fans)
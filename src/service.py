@@ -1,36 +1,56 @@
 import os
 import time
-import threading
+import asyncio
+import contextlib
+import signal
 import sys
+from concurrent.futures import ThreadPoolExecutor
 import usb.core
 import usb.util
 import psutil
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import FileResponse
 from parseArg import extractVersion
-from utils import DEV_MODE, SOCKET_PATH, get_build_identity
-from models import Fan, SystemStatus, VersionInfo, VersionStatus
-from typing import List, Literal
+from utils import DEV_MODE, FAILSAFE_BOOST, PREFETCH_DIR, RECORD_PATH, SOCKET_PATH, get_build_identity
+from models import Fan, SystemStatus, TickTiming, VersionInfo, VersionStatus
+from protocol import STATUS_MEDIA_TYPE, encode_status
+from shm import SHM_PATH, StatusSegment
+from capture import Recorder
+from control import FAN_WRITE_INTERVAL, LOOP_INTERVAL, ControlState
+from analytics import FanAnalytics
+from updates import CHECKSUMS_ASSET, cache_path, download, prune, resolve_digest
+from typing import Awaitable, Callable, List, Literal, Tuple
 from vars import APP_NAME, APP_RAW_VERSION, APP_RC, APP_VERSION
 import httpx 
 
 shared_state: SystemStatus = None
+shared_state_bin: bytes = None
+status_segment: StatusSegment = None
+recorder: Recorder = None
+tick_timing = TickTiming()
 
 def update_state(temp: int, fans: List[Fan]):
-    global shared_state
+    global shared_state, shared_state_bin
     shared_state = SystemStatus(
             timestamp=time.time(),
             cpu_temp=temp,
             fans=fans
         )
+    # Encoded once per snapshot, /status.bin and the shm segment share the bytes
+    shared_state_bin = encode_status(shared_state)
+    if status_segment:
+        status_segment.publish(shared_state_bin)
 
 LATEST_VER: VersionInfo = None
 LAST_VER_CHECK = 0.0
 LAST_VER_FETCH = 0.0
+BUILD_IDENTITY: Tuple[str, str, str] = None
 
-def fetch_github_tag():
+async def fetch_github_tag():
     global LAST_VER_FETCH
     global LATEST_VER
+    global BUILD_IDENTITY
     current_ver = extractVersion(APP_RAW_VERSION)
     repo = "Yoinky3000/LL-Connect-Wireless"
     url = f"https://api.github.com/repos/{repo}/releases"
@@ -48,8 +68,8 @@ def fetch_github_tag():
         else:
             now = time.time()
             if (now - LAST_VER_FETCH) < 75: return
-            with httpx.Client(timeout=5.0) as client:
-                response = client.get(url)
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                response = await client.get(url)
                 if response.status_code == 200:
                     release_res = response.json()
                 else:
@@ -61,16 +81,25 @@ def fetch_github_tag():
             return
         
         releases: List[VersionInfo] = []
-        dist, arch, ext = get_build_identity()
+        if BUILD_IDENTITY is None:
+            # Runs `rpm -E`, keep it off the loop and only do it once
+            BUILD_IDENTITY = await asyncio.to_thread(get_build_identity)
+        dist, arch, ext = BUILD_IDENTITY
         match_pattern = f"{dist}.{arch}{ext}"
         for r in release_res:
             assets = r.get("assets", [])
             installer_url=None 
+            installer_name=None
+            installer_digest=None
+            checksums_url=None
             for asset in assets:
-                if match_pattern in asset["name"]:
+                if asset["name"] == CHECKSUMS_ASSET:
+                    checksums_url = asset["browser_download_url"]
+                elif installer_url is None and match_pattern in asset["name"]:
                     installer_url = asset["browser_download_url"]
-                    break
-            releases.append(extractVersion(raw_tag=r["tag_name"].lstrip('v'), release_note=r.get("body", "No release notes provided."), installer_url=installer_url))
+                    installer_name = asset["name"]
+                    installer_digest = asset.get("digest")
+            releases.append(extractVersion(raw_tag=r["tag_name"].lstrip('v'), release_note=r.get("body", "No release notes provided."), installer_url=installer_url, installer_name=installer_name, installer_digest=installer_digest, checksums_url=checksums_url))
         if APP_RC == 0:
             for r in releases:
                 if not r.rc:
@@ -87,6 +116,8 @@ def fetch_github_tag():
                     break
         
         if LATEST_VER:
+            if is_outdated(LATEST_VER):
+                schedule_prefetch(LATEST_VER)
             return True
         else:
             LATEST_VER = current_ver
@@ -95,6 +126,46 @@ def fetch_github_tag():
         print(f"Failed to fetch latest tag: {e}")
         LATEST_VER = current_ver
 
+def is_outdated(ver: VersionInfo):
+    new_ver = ver.semver > APP_VERSION
+    graduation = (ver.semver == APP_VERSION and APP_RC > 0 and ver.rc == 0)
+    new_rc = (ver.semver == APP_VERSION and ver.rc > APP_RC)
+    return new_ver or graduation or new_rc
+
+
+# ==============================
+# INSTALLER PREFETCH
+# ==============================
+# Throttled so the background download never competes with the desktop for bandwidth
+PREFETCH_RATE = 512 * 1024
+
+PREFETCH_TASK: asyncio.Task = None
+PREFETCH_DONE: str = None
+
+async def prefetch_installer(ver: VersionInfo):
+    global PREFETCH_DONE
+    try:
+        async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
+            digest = await resolve_digest(client, ver)
+            if not digest:
+                print(f"No published digest for {ver.raw_tag}, skip installer prefetch")
+                return
+            path = await download(client, ver.installer_url, cache_path(PREFETCH_DIR, ver), digest, PREFETCH_RATE)
+        await asyncio.to_thread(prune, PREFETCH_DIR, ver.raw_tag)
+        PREFETCH_DONE = ver.raw_tag
+        print(f"Prefetched installer for {ver.raw_tag} to {path}")
+    except Exception as e:
+        print(f"Failed to prefetch installer: {e}")
+
+# Cancelled on shutdown; the .part file stays in the cache directory and is resumed next time
+def schedule_prefetch(ver: VersionInfo):
+    global PREFETCH_TASK
+    if not ver.installer_url or PREFETCH_DONE == ver.raw_tag:
+        return
+    if PREFETCH_TASK and not PREFETCH_TASK.done():
+        return
+    PREFETCH_TASK = asyncio.get_running_loop().create_task(prefetch_installer(ver))
+
 
 # ==============================
 # SOCK SERVER
@@ -105,17 +176,29 @@ app = FastAPI()
 async def get_status():
     return shared_state
 
+@app.get("/status.bin")
+async def get_status_bin():
+    if shared_state_bin is None:
+        return Response(status_code=503)
+    return Response(content=shared_state_bin, media_type=STATUS_MEDIA_TYPE)
+
+# The cache directory is private to the service's dynamic user, so the CLI gets the installer here
+@app.get("/update/installer/{tag}")
+async def get_installer(tag: str):
+    if not LATEST_VER or PREFETCH_DONE != tag or LATEST_VER.raw_tag != tag:
+        return Response(status_code=404)
+    path = cache_path(PREFETCH_DIR, LATEST_VER)
+    if not path.is_file():
+        return Response(status_code=404)
+    return FileResponse(path, filename=path.name)
+
 @app.get("/version", response_model=VersionStatus)
 async def get_version():
-    fetch_github_tag()
+    await fetch_github_tag()
     global LAST_VER_CHECK, LATEST_VER
     now = time.time()
     
-    new_ver = LATEST_VER.semver > APP_VERSION
-    graduation = (LATEST_VER.semver == APP_VERSION and APP_RC > 0 and LATEST_VER.rc == 0)
-    new_rc = (LATEST_VER.semver == APP_VERSION and LATEST_VER.rc > APP_RC)
-    
-    outdated = new_ver or graduation or new_rc
+    outdated = is_outdated(LATEST_VER)
     
     is_stale = (now - LAST_VER_CHECK) > 3600
     
@@ -135,12 +218,22 @@ async def get_version():
         outdated=outdated
     )
 
+@app.get("/timing", response_model=TickTiming)
+async def get_timing():
+    return tick_timing
+
 @app.get("/")
 async def root():
     return {"status": "running", "service": APP_NAME}
 
-def start_api_server():
-    uvicorn.run(app, uds=SOCKET_PATH, log_level="warning")
+class ApiServer(uvicorn.Server):
+    # Signals are handled by the daemon's own loop, which then shuts the server down
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+def create_api_server():
+    return ApiServer(uvicorn.Config(app, uds=SOCKET_PATH, log_level="warning"))
 
 
 # ==============================
@@ -157,24 +250,6 @@ GET_DEV_CMD = 0x10
 RF_PAGE_STRIDE = 434
 MAX_DEVICES_PAGE = 10
 
-# ==============================
-# USER CONFIG
-# ==============================
-MIN_PWM = 20
-MAX_PWM = 175
-
-MIN_TEMP = 35.0
-MAX_TEMP = 85.0
-
-DAMPING_SECOND = 2.0
-DAMPING_TEMP   = 1.0
-
-PWM_STEP = 4
-PWM_STEP_INTERVAL = 0.5
-
-
-LOOP_INTERVAL  = 0.5
-
 # ==============================
 # UTILS
 # ==============================
@@ -184,9 +259,6 @@ def u8(x):
 def mac_to_bytes(mac):
     return bytes(int(b, 16) for b in mac.split(":"))
 
-def clamp(v, lo, hi):
-    return max(lo, min(hi, v))
-
 def clear_console():
     sys.stdout.write("\033[H\033[J")
     sys.stdout.flush()
@@ -241,12 +313,17 @@ def fetch_page(rx: usb.core.Device, page_count: int):
         if len(chunk) < 512:
             break
 
+    if recorder:
+        recorder.page(buf)
     return buf
 
 def list_fans(rx: usb.core.Device, target_pwm: int):
     payload = fetch_page(rx, 1)
     if not payload or payload is None or payload == b'':
         return []
+    return parse_fans(payload, target_pwm)
+
+def parse_fans(payload: bytes, target_pwm: int):
     count = payload[1]
     fans: List[Fan] = []
     offset = 4
@@ -274,7 +351,8 @@ def list_fans(rx: usb.core.Device, target_pwm: int):
                     (record[34] << 8) | record[35],
                 ],
                 target_pwm= target_pwm,
-                is_bound= record[6:12] != b"\x00"*6
+                is_bound= record[6:12] != b"\x00"*6,
+                raw_macs= bytes(record[0:12])
             )
         )
 
@@ -296,22 +374,6 @@ def get_cpu_temp():
 
     return tctl if tctl else (max(values) if values else None)
 
-# ==============================
-# TEMP → PWM
-# ==============================
-def temp_to_pwm(temp):
-    t = clamp(temp, MIN_TEMP, MAX_TEMP)
-    ratio = (t - MIN_TEMP) / (MAX_TEMP - MIN_TEMP)
-    return int(MIN_PWM + ratio * (MAX_PWM - MIN_PWM))
-
-def approach_pwm(current, target, step):
-    if current < target:
-        return min(current + step, target)
-    elif current > target:
-        return max(current - step, target)
-    return current
-
-
 # ==============================
 # BUILD USB DATA
 # ==============================
@@ -341,60 +403,80 @@ def build_data(fan: Fan, seq):
 # ==============================
 # MAIN LOOP
 # ==============================
-def fan_control_loop(rx: usb.core.Device, tx: usb.core.Device):
-    last_temp = None
-    last_target_update = 0
+# pyusb is blocking and not thread safe, so every USB call goes through this single thread
+usb_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="usb")
 
-    last_pwm_step_time = {}
+async def run_usb(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(usb_executor, fn, *args)
+
+async def sleep_until(deadline: float) -> float:
+    loop = asyncio.get_running_loop()
+    if deadline > loop.time():
+        wake = loop.create_future()
+        handle = loop.call_at(deadline, lambda: wake.done() or wake.set_result(None))
+        try:
+            await wake
+        finally:
+            handle.cancel()
+    return loop.time() - deadline
+
+# clock, read_temp, sleep and max_ticks let a replay drive the loop from a capture
+async def fan_control_loop(
+    rx: usb.core.Device,
+    tx: usb.core.Device,
+    clock: Callable[[], float] = time.time,
+    read_temp: Callable[[], float | None] = get_cpu_temp,
+    sleep: Callable[[float], Awaitable[float]] = sleep_until,
+    max_ticks: int | None = None
+):
+    loop = asyncio.get_running_loop()
+    control = ControlState()
+    analytics = FanAnalytics()
     last_fans_amount = 0;
 
     err = 0
-    while True:
+    ticks = 0
+    deadline = loop.time()
+    while max_ticks is None or ticks < max_ticks:
+        ticks += 1
+        tick_start = loop.time()
         try:
-            now = time.time()
-            temp = get_cpu_temp()
+            now = clock()
+            temp = await loop.run_in_executor(None, read_temp)
+            if recorder:
+                recorder.tick(now, temp)
             if temp is None:
-                time.sleep(1)
+                deadline += 1
                 continue
 
-            target_pwm = temp_to_pwm(temp)
-
-            if (
-                last_temp is None or
-                abs(temp - last_temp) >= DAMPING_TEMP and
-                now - last_target_update >= DAMPING_SECOND
-            ):
-                last_temp = temp
-                last_target_update = now
-            else:
-                target_pwm = temp_to_pwm(last_temp)
+            target_pwm = control.target_pwm(temp, now)
 
-            fans = list_fans(rx, target_pwm)
+            fans = await run_usb(list_fans, rx, target_pwm)
 
             if (last_fans_amount != 0 and len(fans) == 0): continue
             last_fans_amount = len(fans)
 
             for f in fans:
-                mac = f.mac
-
-                if mac not in last_pwm_step_time:
-                    last_pwm_step_time[mac] = 0
+                health = analytics.update(f)
+                if FAILSAFE_BOOST and (health.stalled or health.mismatch):
+                    health.boosted = True
+                    f.pwm = f.target_pwm = control.curve.max_pwm
+                else:
+                    f.pwm = control.step_pwm(f.mac, f.pwm, target_pwm, now)
 
-                if now - last_pwm_step_time[mac] >= PWM_STEP_INTERVAL:
-                    f.pwm = approach_pwm(
-                        f.pwm,
-                        target_pwm,
-                        PWM_STEP
-                    )
-                    last_pwm_step_time[mac] = now
+            # The snapshot doesn't change while the frames go out, publish it once per tick
+            update_state(temp, fans)
 
             for f in fans:
                 mac = f.mac
 
                 for i in range(len(fans)):
-                    tx.write(USB_OUT, build_data(f, i))
-                    update_state(temp, fans)
-                time.sleep(0.5)
+                    frame = build_data(f, i)
+                    await run_usb(tx.write, USB_OUT, frame)
+                    if recorder:
+                        recorder.frame(frame)
+                deadline += FAN_WRITE_INTERVAL
+                await sleep(deadline)
 
             if DEV_MODE:
                 clear_console()
@@ -422,41 +504,56 @@ def fan_control_loop(rx: usb.core.Device, tx: usb.core.Device):
                     f"{rpm}"
                 )
             err = 0
-        except:
+        except Exception:
             if err > 3:
                 raise Exception()
             else:
                 err += 1
         finally:
-            time.sleep(LOOP_INTERVAL)
+            deadline += LOOP_INTERVAL
+            # Resync instead of bursting through missed ticks if a USB call stalled
+            if deadline < loop.time():
+                deadline = loop.time()
+            if not asyncio.current_task().cancelling():
+                lateness = await sleep(deadline)
+                tick_timing.record(loop.time() - tick_start, lateness)
 
 
 
 # ==============================
 # ENTRY
 # ==============================
-if __name__ == "__main__":
+async def main():
+    global status_segment, recorder
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
     tx = None
     rx = None
+    server = None
+    api_task = None
+    control_task = None
     try:
         current_ver = extractVersion(APP_RAW_VERSION)
         print(f"Current Version: {APP_RAW_VERSION}")
         print(f"- SEMVER: {current_ver.semver}")
         print(f"- Release Candidate: {current_ver.rc}")
         print(f"- Build Release: {current_ver.release}")
-        res = fetch_github_tag()
+        res = await fetch_github_tag()
         if res:
             print(f"Remote Version Fetched: {LATEST_VER.raw_tag}")
             print(f"- SEMVER: {LATEST_VER.semver}")
             print(f"- Release Candidate: {LATEST_VER.rc}")
             print(f"- Build Release: {LATEST_VER.release}")
         print(f"Start sock server at {SOCKET_PATH}")
-        api_thread = threading.Thread(target=start_api_server, daemon=True)
-        api_thread.start()
+        server = create_api_server()
+        api_task = asyncio.create_task(server.serve())
 
         retries = 0
-        while not os.path.exists(SOCKET_PATH) and retries < 50:
-            time.sleep(0.2)
+        while not server.started and not api_task.done() and retries < 50:
+            await asyncio.sleep(0.2)
             retries += 1
         
         if os.path.exists(SOCKET_PATH):
@@ -465,24 +562,61 @@ if __name__ == "__main__":
             except OSError:
                 pass
 
-        tx = open_device(TX)
-        rx = open_device(RX)
+        try:
+            status_segment = StatusSegment(SHM_PATH)
+            print(f"Mirror status to {SHM_PATH}")
+        except OSError as e:
+            print(f"Could not create status segment: {e}")
+
+        if RECORD_PATH:
+            try:
+                recorder = Recorder(RECORD_PATH)
+                print(f"Recording USB traffic to {RECORD_PATH}")
+            except (OSError, ValueError) as e:
+                print(f"Could not record USB traffic: {e}")
+
+        tx = await run_usb(open_device, TX)
+        rx = await run_usb(open_device, RX)
 
-        fans = list_fans(rx, 0)
+        fans = await run_usb(list_fans, rx, 0)
         displayDetected(fans)
 
-        time.sleep(5 if DEV_MODE else 0)
+        await asyncio.sleep(5 if DEV_MODE else 0)
         
-        fan_control_loop(rx, tx)
+        control_task = asyncio.create_task(fan_control_loop(rx, tx))
+        stop_task = asyncio.create_task(stop.wait())
+        await asyncio.wait([control_task, api_task, stop_task], return_when=asyncio.FIRST_COMPLETED)
+        stop_task.cancel()
+
+        for task in (control_task, api_task):
+            if task.done() and not task.cancelled() and task.exception():
+                raise task.exception()
 
-    except KeyboardInterrupt:
-        pass
     except Exception as e:
         print(f"Error: {e}")
     finally:
-        if tx: usb.util.dispose_resources(tx)
-        if rx: usb.util.dispose_resources(rx)
+        if control_task and not control_task.done():
+            control_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await control_task
+        if PREFETCH_TASK and not PREFETCH_TASK.done():
+            PREFETCH_TASK.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await PREFETCH_TASK
+        if server and api_task and not api_task.done():
+            server.should_exit = True
+            with contextlib.suppress(Exception):
+                await api_task
+
+        if tx: await run_usb(usb.util.dispose_resources, tx)
+        if rx: await run_usb(usb.util.dispose_resources, rx)
+        usb_executor.shutdown()
+        if status_segment: status_segment.close(unlink=True)
+        if recorder: recorder.close()
         
         if os.path.exists(SOCKET_PATH):
             os.unlink(SOCKET_PATH)
-        sys.exit(0)
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    sys.exit(0)
@@ -0,0 +1,112 @@
+import fcntl
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from protocol import FAN, HEADER, StatusView, decode_status, truncate_status
+from utils import SOCKET_DIR
+
+# ==============================
+# SHARED MEMORY STATUS SEGMENT
+# ==============================
+# Layout:
+#   seq(u64) length(u32) pad(4) | binary status payload (see protocol.py)
+#
+# The writer bumps seq to an odd value, writes the payload, then bumps it to
+# the next even value. Readers retry until they see the same even seq before
+# and after copying the payload.
+
+SHM_PATH = str(SOCKET_DIR / "status.shm")
+
+SEG_HEADER = struct.Struct("<QI4x")
+SEQ = struct.Struct("<Q")
+LENGTH = struct.Struct("<I")
+
+MAX_FANS = 60
+SEG_CAPACITY = HEADER.size + FAN.size * MAX_FANS
+SEG_SIZE = SEG_HEADER.size + SEG_CAPACITY
+
+READ_SPINS = 100
+READ_TIMEOUT = 1.0
+
+
+class StatusSegment:
+    def __init__(self, path: str = SHM_PATH):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.fchmod(self.fd, 0o644)
+        except OSError:
+            pass
+        if os.fstat(self.fd).st_size < SEG_SIZE:
+            os.ftruncate(self.fd, SEG_SIZE)
+        self.mm = mmap.mmap(self.fd, SEG_SIZE)
+
+    def publish(self, payload: bytes):
+        # payload is an encode_status() snapshot
+        if len(payload) > SEG_CAPACITY:
+            payload = truncate_status(payload, MAX_FANS)
+
+        # flock keeps concurrent writers (e.g. a restarting daemon) from interleaving
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            seq = SEQ.unpack_from(self.mm, 0)[0]
+            if seq & 1:
+                seq += 1
+            SEQ.pack_into(self.mm, 0, seq + 1)
+            LENGTH.pack_into(self.mm, SEQ.size, len(payload))
+            self.mm[SEG_HEADER.size:SEG_HEADER.size + len(payload)] = payload
+            SEQ.pack_into(self.mm, 0, seq + 2)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def close(self, unlink: bool = False):
+        self.mm.close()
+        os.close(self.fd)
+        if unlink and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class StatusReader:
+    def __init__(self, path: str = SHM_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), SEG_SIZE, prot=mmap.PROT_READ)
+
+    def read_raw(self) -> bytes | None:
+        mm = self.mm
+        deadline = None
+        spins = 0
+        while True:
+            before = SEQ.unpack_from(mm, 0)[0]
+            if before == 0:
+                return None
+            if not before & 1:
+                length = LENGTH.unpack_from(mm, SEQ.size)[0]
+                if length <= SEG_CAPACITY:
+                    payload = mm[SEG_HEADER.size:SEG_HEADER.size + length]
+                    if SEQ.unpack_from(mm, 0)[0] == before:
+                        return payload
+
+            # Writer is mid-update; spin briefly, then yield so it can finish
+            spins += 1
+            if spins < READ_SPINS:
+                continue
+            if deadline is None:
+                deadline = time.monotonic() + READ_TIMEOUT
+            elif time.monotonic() > deadline:
+                break
+            os.sched_yield()
+        raise TimeoutError("Could not read a consistent status snapshot")
+
+    def read(self) -> StatusView | None:
+        payload = self.read_raw()
+        if payload is None:
+            return None
+        return decode_status(payload)
+
+    def close(self):
+        self.mm.close()
+
@@ -0,0 +1,168 @@
+import bisect
+import math
+import random
+import time
+from typing import List, Tuple
+from control import ControlState, temp_to_pwm, tick_length
+from models import Curve
+
+# ==============================
+# TEMPERATURE TRACES
+# ==============================
+SYNTHETIC_TRACES = ["step", "ramp", "sine"]
+
+class Trace:
+    def __init__(self, points: List[Tuple[float, float]]):
+        if not points:
+            raise ValueError("Temperature trace is empty")
+        points = sorted(points)
+        self.times = [t for t, _ in points]
+        self.temps = [v for _, v in points]
+        self.duration = self.times[-1]
+
+    # Step-hold lookup: the last sample at or before t
+    def at(self, t: float) -> float:
+        i = bisect.bisect_right(self.times, t) - 1
+        return self.temps[max(i, 0)]
+
+def load_trace(path: str, interval: float = 1.0) -> Trace:
+    if interval <= 0:
+        raise ValueError("interval must be greater than 0")
+    points = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            cols = [c for c in line.replace(",", " ").split() if c]
+            try:
+                values = [float(c) for c in cols]
+            except ValueError:
+                # Header row
+                continue
+            if len(values) >= 2:
+                points.append((values[0], values[1]))
+            else:
+                points.append((len(points) * interval, values[0]))
+    return Trace(points)
+
+def synthetic_trace(kind: str, duration: float = 600.0, interval: float = 1.0, noise: float = 0.0, seed: int = 0) -> Trace:
+    if interval <= 0:
+        raise ValueError("interval must be greater than 0")
+    if duration <= 0:
+        raise ValueError("duration must be greater than 0")
+    rng = random.Random(seed)
+    points = []
+    steps = int(duration / interval) + 1
+    for i in range(steps):
+        t = i * interval
+        frac = t / duration
+        if kind == "step":
+            temp = 75.0 if 0.1 <= frac < 0.6 else 40.0
+        elif kind == "ramp":
+            temp = 35.0 + 50.0 * (1 - abs(2 * frac - 1))
+        elif kind == "sine":
+            temp = 60.0 + 20.0 * math.sin(2 * math.pi * t / 120.0)
+        else:
+            raise ValueError(f"Unknown synthetic trace: {kind}")
+        if noise:
+            temp += rng.gauss(0.0, noise)
+        points.append((t, temp))
+    return Trace(points)
+
+
+# ==============================
+# SIMULATION
+# ==============================
+class SimResult:
+    def __init__(self):
+        # (time, temp, ideal pwm, damped target pwm, pwm)
+        self.samples: List[Tuple[float, float, int, int, int]] = []
+        self.pwm_changes = 0
+        self.frames = 0
+        self.settle_times: List[float] = []
+        self.unsettled = 0
+        self.wall_time = 0.0
+
+    @property
+    def sim_time(self) -> float:
+        return self.samples[-1][0] if self.samples else 0.0
+
+    @property
+    def rms_error(self) -> float:
+        if not self.samples:
+            return 0.0
+        return math.sqrt(sum((s[4] - s[2]) ** 2 for s in self.samples) / len(self.samples))
+
+def simulate(trace: Trace, curve: Curve = Curve(), devices: int = 1, start_pwm: int | None = None) -> SimResult:
+    if devices < 1:
+        raise ValueError("devices must be at least 1")
+    if start_pwm is not None and not 0 <= start_pwm <= 255:
+        raise ValueError("start pwm must be between 0 and 255")
+    state = ControlState(curve)
+    result = SimResult()
+    mac = "sim"
+
+    # Same cadence as fan_control_loop: one write pause per device, then the loop pause
+    tick = tick_length(devices)
+    pwm = curve.min_pwm if start_pwm is None else start_pwm
+    last_target = None
+    target_since = None
+
+    wall_start = time.perf_counter()
+    t = 0.0
+    while t <= trace.duration:
+        temp = trace.at(t)
+        target = state.target_pwm(temp, t)
+        new_pwm = state.step_pwm(mac, pwm, target, t)
+
+        if target != last_target:
+            if target_since is not None:
+                result.unsettled += 1
+            if new_pwm == target:
+                result.settle_times.append(0.0)
+                target_since = None
+            else:
+                target_since = t
+            last_target = target
+        if new_pwm != pwm:
+            result.pwm_changes += 1
+            if new_pwm == target and target_since is not None:
+                result.settle_times.append(t - target_since)
+                target_since = None
+        pwm = new_pwm
+
+        result.frames += devices * devices
+        result.samples.append((t, temp, temp_to_pwm(temp, curve), target, pwm))
+        t += tick
+    if target_since is not None:
+        result.unsettled += 1
+
+    result.wall_time = time.perf_counter() - wall_start
+    return result
+
+def print_result(result: SimResult, curve: Curve):
+    print("\033[1mCurve\033[0m")
+    for name, value in curve.model_dump().items():
+        print(f"  {name:18} {value}")
+    print("-" * 40)
+
+    speedup = result.sim_time / result.wall_time if result.wall_time > 0 else float("inf")
+    print(f"Simulated time:    {result.sim_time:.1f}s in {result.wall_time * 1000:.1f}ms ({speedup:,.0f}x real time)")
+    print(f"Ticks:             {len(result.samples)}")
+    print(f"PWM changes:       {result.pwm_changes}")
+    print(f"Frames sent:       {result.frames}")
+    print(f"RMS from target:   {result.rms_error:.2f} PWM")
+    if result.settle_times:
+        mean = sum(result.settle_times) / len(result.settle_times)
+        print(f"Time to target:    mean {mean:.1f}s, max {max(result.settle_times):.1f}s ({len(result.settle_times)} targets reached)")
+    else:
+        print("Time to target:    no target changes reached")
+    if result.unsettled:
+        print(f"Targets not reached before the next change: {result.unsettled}")
+
+def write_csv(result: SimResult, path: str):
+    with open(path, "w") as f:
+        f.write("time,temp,ideal_pwm,target_pwm,pwm\n")
+        for t, temp, ideal, target, pwm in result.samples:
+            f.write(f"{t:.3f},{temp:.2f},{ideal},{target},{pwm}\n")
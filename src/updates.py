@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import shutil
+import time
+from pathlib import Path
+import httpx
+from models import VersionInfo
+
+# ==============================
+# UPDATE DOWNLOADS
+# ==============================
+# Installers are cached as <root>/<release tag>/<asset name>. Partial downloads
+# are kept as "<asset>.part" and resumed with an HTTP Range request.
+
+CHUNK_SIZE = 64 * 1024
+DOWNLOAD_ATTEMPTS = 3
+CHECKSUMS_ASSET = "SHA256SUMS"
+
+
+class VerifyError(Exception):
+    pass
+
+
+def installer_name(info: VersionInfo) -> str | None:
+    if info.installer_name:
+        return info.installer_name
+    if info.installer_url:
+        return info.installer_url.rsplit("/", 1)[-1]
+    return None
+
+def cache_path(root: Path, info: VersionInfo) -> Path:
+    return Path(root) / info.raw_tag / installer_name(info)
+
+def file_digest(path: Path, algo: str = "sha256") -> str:
+    h = hashlib.new(algo)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return f"{algo}:{h.hexdigest()}"
+
+def normalize_digest(digest: str) -> str:
+    digest = digest.strip().lower()
+    return digest if ":" in digest else f"sha256:{digest}"
+
+def verify(path: Path, digest: str) -> bool:
+    digest = normalize_digest(digest)
+    return file_digest(path, digest.split(":", 1)[0]) == digest
+
+def find_checksum(checksums: str, name: str) -> str | None:
+    for line in checksums.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].lstrip("*") == name:
+            return f"sha256:{parts[0].lower()}"
+    return None
+
+async def resolve_digest(client: httpx.AsyncClient, info: VersionInfo) -> str | None:
+    if info.installer_digest:
+        return normalize_digest(info.installer_digest)
+    if not info.checksums_url:
+        return None
+
+    response = await client.get(info.checksums_url)
+    response.raise_for_status()
+    return find_checksum(response.text, installer_name(info))
+
+def prune(root: Path, keep_tag: str):
+    root = Path(root)
+    if not root.is_dir():
+        return
+    for entry in root.iterdir():
+        if entry.is_dir() and entry.name != keep_tag:
+            shutil.rmtree(entry, ignore_errors=True)
+
+def _range_headers(part: Path) -> tuple[int, dict]:
+    offset = part.stat().st_size if part.exists() else 0
+    return offset, ({"Range": f"bytes={offset}-"} if offset else {})
+
+def _resume_offset(response: httpx.Response, offset: int) -> int | None:
+    if offset and response.status_code == 416:
+        # Nothing left to fetch, the digest check decides if the part is usable
+        return None
+    response.raise_for_status()
+
+    content_range = response.headers.get("Content-Range", "")
+    if response.status_code != 206 or not content_range.startswith(f"bytes {offset}-"):
+        # Server ignored the range, start over
+        return 0
+    return offset
+
+async def _fetch(client: httpx.AsyncClient, url: str, part: Path, rate_limit: int | None):
+    offset, headers = _range_headers(part)
+    async with client.stream("GET", url, headers=headers) as response:
+        offset = _resume_offset(response, offset)
+        if offset is None:
+            return
+
+        start = time.monotonic()
+        received = 0
+        with open(part, "ab" if offset else "wb") as f:
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                f.write(chunk)
+                received += len(chunk)
+                if rate_limit:
+                    ahead = received / rate_limit - (time.monotonic() - start)
+                    if ahead > 0:
+                        await asyncio.sleep(ahead)
+
+def _finish(part: Path, dest: Path, digest: str) -> Path:
+    if not verify(part, digest):
+        part.unlink()
+        raise VerifyError(f"Checksum mismatch for {dest.name}, expected {digest}")
+    part.replace(dest)
+    return dest
+
+async def download(client: httpx.AsyncClient, url: str, dest: Path, digest: str, rate_limit: int | None = None) -> Path:
+    # Hashing a whole installer would stall the daemon's event loop, so it runs in a thread
+    dest = Path(dest)
+    if dest.is_file():
+        if await asyncio.to_thread(verify, dest, digest):
+            return dest
+        dest.unlink()
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    part = dest.with_name(dest.name + ".part")
+
+    for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+        try:
+            await _fetch(client, url, part, rate_limit)
+            break
+        except httpx.TransportError:
+            if attempt == DOWNLOAD_ATTEMPTS:
+                raise
+
+    return await asyncio.to_thread(_finish, part, dest, digest)
@@ -5,9 +5,14 @@ import subprocess
 from vars import APP_NAME
 
 DEV_MODE = os.getenv("DEV")
+RECORD_PATH = os.getenv("LLCW_RECORD")
+FAILSAFE_BOOST = os.getenv("LLCW_FAILSAFE_BOOST")
 ROOT_DIR = Path(os.path.realpath(__file__)).parent
 SOCKET_DIR = (ROOT_DIR / ".sock") if DEV_MODE else Path("/run") / APP_NAME
 SOCKET_PATH = str(SOCKET_DIR / "ll-connect-wireless.sock")
+CACHE_DIR = (ROOT_DIR / ".cache") if DEV_MODE else Path("/var/cache") / APP_NAME
+PREFETCH_DIR = CACHE_DIR / "updates"
+UPDATE_CACHE_DIR = Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / APP_NAME / "updates"
 
 def get_build_identity():
     arch = platform.machine()
@@ -0,0 +1,6 @@
+#!/usr/bin/env bash
+
+ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+source "$ROOT_DIR/vars.sh"
+
+DEV=1 $PYTHON_EXEC -m pytest "$ROOT_DIR/tests" "$@"
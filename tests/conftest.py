@@ -0,0 +1,6 @@
+import os
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(os.path.realpath(__file__)).parent.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
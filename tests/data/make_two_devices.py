@@ -0,0 +1,118 @@
+import asyncio
+import contextlib
+import io
+import os
+import sys
+from pathlib import Path
+
+# ==============================
+# two_devices.cap GENERATOR
+# ==============================
+# Records the real control loop against two fake devices that apply the PWM
+# frames they receive. Re-run it when the control behaviour changes on purpose
+# (needs the generated src/vars.py, e.g. after ./test.sh):
+#
+#   python tests/data/make_two_devices.py
+
+DATA_DIR = Path(os.path.realpath(__file__)).parent
+sys.path.insert(0, str(DATA_DIR.parent.parent / "src"))
+
+import service
+from capture import Recorder, replay_sleep
+
+CAPTURE_PATH = DATA_DIR / "two_devices.cap"
+
+MASTER_MAC = bytes([0x10, 0x20, 0x30, 0x40, 0x50, 0x60])
+DEVICES = {
+    bytes([0x58, 0xcc, 0x1e, 0xa7, 0x14, 0x54]): 60,
+    bytes([0x2e, 0xc1, 0x1e, 0xa7, 0x14, 0x54]): 90,
+}
+
+# None is a tick without a CPU reading
+TEMPS = [45.0, 45.2, 47.5, 52.0, 58.0, 58.3, 64.0, 70.0, 71.5, 69.0, 60.0, None, 55.0, 50.0, 49.5, 48.0]
+START_CLOCK = 1760000000.0
+TICK_SECONDS = 1.5
+
+# Device 2 loses its third fan after this many page requests
+STALL_AFTER = 8
+
+
+class FakeController:
+    def __init__(self):
+        self.pwm = dict(DEVICES)
+        self.pending = b""
+        self.requests = 0
+
+    def record(self, index: int, mac: bytes) -> bytes:
+        record = bytearray(42)
+        record[0:6] = mac
+        record[6:12] = MASTER_MAC
+        record[12] = 8
+        record[13] = 1
+        record[19] = 13 + index
+        for slot in range(4 if index else 3):
+            stalled = index == 1 and slot == 2 and self.requests > STALL_AFTER
+            rpm = 0 if stalled else self.pwm[mac] * 8 + slot * 3 + self.requests % 5
+            record[28 + slot * 2] = rpm >> 8
+            record[29 + slot * 2] = rpm & 0xFF
+        record[36:40] = bytes([self.pwm[mac]] * 4)
+        record[41] = 28
+        return bytes(record)
+
+    def write(self, endpoint, data, timeout=None):
+        # A first frame of a device carries its PWM
+        if endpoint == service.USB_OUT and len(data) > 21 and data[1] == 0 and bytes(data[6:12]) in self.pwm:
+            self.pwm[bytes(data[6:12])] = data[21]
+        elif data[0] == service.GET_DEV_CMD:
+            self.requests += 1
+            page = bytearray(4)
+            page[1] = len(self.pwm)
+            for index, mac in enumerate(self.pwm):
+                page += self.record(index, mac)
+            self.pending = bytes(page) + bytes(service.RF_PAGE_STRIDE - len(page))
+        return len(data)
+
+    def read(self, endpoint, size, timeout=None):
+        chunk = self.pending[:min(size, 512)]
+        self.pending = self.pending[len(chunk):]
+        return chunk
+
+
+class FakeSensor:
+    def __init__(self):
+        self.index = 0
+        self.temp = None
+
+    def clock(self) -> float:
+        self.temp = TEMPS[self.index]
+        self.index += 1
+        return START_CLOCK + self.index * TICK_SECONDS
+
+    def read(self) -> float | None:
+        return self.temp
+
+
+async def record(path: Path):
+    if path.exists():
+        path.unlink()
+    controller = FakeController()
+    sensor = FakeSensor()
+    service.recorder = Recorder(str(path))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Like the daemon, list the devices once before the loop starts
+            service.list_fans(controller, 0)
+            await service.fan_control_loop(
+                controller, controller,
+                clock=sensor.clock,
+                read_temp=sensor.read,
+                sleep=replay_sleep,
+                max_ticks=len(TEMPS)
+            )
+    finally:
+        service.recorder.close()
+        service.recorder = None
+
+if __name__ == "__main__":
+    asyncio.run(record(CAPTURE_PATH))
+    print(f"Capture written to {CAPTURE_PATH}")
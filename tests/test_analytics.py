@@ -0,0 +1,55 @@
+from analytics import EXPECTED_WARMUP, PWM_BUCKET_SHIFT, RECOVER_TICKS, FanStats
+from models import Curve
+
+BOOST_PWM = Curve().max_pwm
+BOOST_BUCKET = BOOST_PWM >> PWM_BUCKET_SHIFT
+
+
+def flagged(health) -> bool:
+    return bool(health.stalled or health.mismatch)
+
+def run_boosted(stats: FanStats, pwm: int, rpm: int, ticks: int):
+    # Same decision as the fail-safe boost in fan_control_loop
+    states = []
+    for _ in range(ticks):
+        health = stats.update(pwm, [rpm] * 3)
+        if flagged(health):
+            pwm = BOOST_PWM
+        states.append((pwm, health))
+    return states
+
+def test_boost_latches_and_degraded_rpm_is_not_learned():
+    stats = FanStats()
+    for _ in range(EXPECTED_WARMUP * 2):
+        assert not flagged(stats.update(80, [1000] * 3))
+
+    states = run_boosted(stats, 80, 400, 20)
+    first = next(i for i, (_, health) in enumerate(states) if flagged(health))
+    assert first <= 2
+    for pwm, health in states[first:]:
+        assert pwm == BOOST_PWM
+        assert health.mismatch
+        assert round(stats.expected[BOOST_BUCKET]) != 400
+    assert stats.expected_count[BOOST_BUCKET] == 0
+
+def test_boost_releases_once_fan_recovers():
+    stats = FanStats()
+    for _ in range(EXPECTED_WARMUP * 2):
+        stats.update(80, [1000] * 3)
+    run_boosted(stats, 80, 400, 5)
+
+    # Spinning at its normal speed again while boosted
+    states = [stats.update(BOOST_PWM, [1400] * 3) for _ in range(RECOVER_TICKS)]
+    assert all(flagged(h) for h in states[:-1])
+    assert not flagged(states[-1])
+
+def test_stall_latches_until_slot_spins():
+    stats = FanStats()
+    stats.update(120, [900, 900, 900])
+    stats.update(120, [900, 0, 900])
+    health = stats.update(120, [900, 0, 900])
+    assert health.stalled == [1]
+
+    # One good reading is not enough
+    assert stats.update(BOOST_PWM, [1300, 1300, 1300]).stalled == [1]
+    assert stats.update(BOOST_PWM, [1300, 1300, 1300]).stalled == []
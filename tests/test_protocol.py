@@ -0,0 +1,93 @@
+import math
+import struct
+
+import pytest
+
+from models import Fan, FanHealth, SystemStatus
+from protocol import FAN, HEADER, STATUS_MAGIC, decode_status, encode_status, truncate_status
+
+
+def make_fan(i: int, rpm=None, health=None, raw=True) -> Fan:
+    mac = f"58:cc:1e:a7:14:{i:02x}"
+    master = "2e:c1:1e:a7:14:54"
+    return Fan(
+        mac=mac,
+        master_mac=master,
+        channel=8,
+        rx_type=1,
+        fan_count=3,
+        pwm=90 + i,
+        rpm=[700 + i, 701, 702, 0] if rpm is None else rpm,
+        target_pwm=120,
+        is_bound=True,
+        health=health,
+        raw_macs=bytes.fromhex((mac + master).replace(":", "")) if raw else None
+    )
+
+def make_status(fans, cpu_temp=52.5) -> SystemStatus:
+    return SystemStatus(timestamp=1760000000.25, cpu_temp=cpu_temp, fans=fans)
+
+
+def test_round_trip():
+    health = FanHealth(rpm_avg=701, rpm_std=3, expected_rpm=710, stalled=[3], mismatch=True, boosted=True)
+    status = make_status([make_fan(0, health=health), make_fan(1, raw=False)])
+    view = decode_status(encode_status(status))
+
+    assert view.timestamp == status.timestamp
+    assert view.cpu_temp == 52.5
+    assert len(view.fans) == 2
+    for fan, got in zip(status.fans, view.fans):
+        assert got.mac == fan.mac
+        assert got.master_mac == fan.master_mac
+        assert (got.channel, got.rx_type, got.fan_count) == (fan.channel, fan.rx_type, fan.fan_count)
+        assert (got.pwm, got.target_pwm, got.is_bound) == (fan.pwm, fan.target_pwm, fan.is_bound)
+        assert list(got.rpm) == fan.rpm
+
+    got = view.fans[0].health
+    assert (got.rpm_avg, got.rpm_std, got.expected_rpm) == (701, 3, 710)
+    assert got.stalled == (3,)
+    assert got.mismatch and got.boosted
+    assert view.fans[1].health is None
+
+def test_health_without_flags_or_expectation():
+    health = FanHealth(rpm_avg=0, rpm_std=0)
+    got = decode_status(encode_status(make_status([make_fan(0, health=health)]))).fans[0].health
+    assert got is not None
+    assert got.expected_rpm is None
+    assert got.stalled == ()
+    assert not got.mismatch and not got.boosted
+
+def test_missing_cpu_temp():
+    view = decode_status(encode_status(make_status([make_fan(0)], cpu_temp=None)))
+    assert view.cpu_temp is None
+
+def test_short_rpm_list_is_padded():
+    view = decode_status(encode_status(make_status([make_fan(0, rpm=[800, 801])])))
+    assert view.fans[0].rpm == (800, 801, 0, 0)
+
+def test_empty_status():
+    view = decode_status(encode_status(make_status([])))
+    assert view.fans == []
+
+def test_rejects_bad_payloads():
+    payload = encode_status(make_status([make_fan(0)]))
+
+    with pytest.raises(ValueError, match="short"):
+        decode_status(payload[:HEADER.size - 1])
+    with pytest.raises(ValueError, match="magic"):
+        decode_status(b"XXXX" + payload[4:])
+    with pytest.raises(ValueError, match="schema"):
+        decode_status(payload[:4] + struct.pack("<H", 99) + payload[6:])
+    with pytest.raises(ValueError, match="truncated"):
+        decode_status(payload[:-1])
+
+def test_truncate_status():
+    payload = encode_status(make_status([make_fan(i) for i in range(5)]))
+
+    assert truncate_status(payload, 5) is payload
+    cut = truncate_status(payload, 2)
+    assert len(cut) == HEADER.size + FAN.size * 2
+    view = decode_status(cut)
+    assert [f.mac for f in view.fans] == ["58:cc:1e:a7:14:00", "58:cc:1e:a7:14:01"]
+    assert HEADER.unpack_from(cut)[0] == STATUS_MAGIC
+    assert view.cpu_temp == 52.5 and not math.isnan(view.cpu_temp)
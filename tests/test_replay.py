@@ -0,0 +1,54 @@
+import asyncio
+from pathlib import Path
+
+import service
+from capture import (FILE_HEADER, KIND_FRAME, KIND_PAGE, KIND_START, KIND_TICK, Recorder,
+                     load_capture, load_sessions, replay_control)
+
+# Built by data/make_two_devices.py: two fake devices that apply the frames they receive; one
+# tick has no CPU temperature and device 2 loses a fan slot halfway through
+CAPTURE = str(Path(__file__).parent / "data" / "two_devices.cap")
+
+
+def test_capture_has_ticks_and_frames():
+    kinds = [kind for kind, _, _ in load_capture(CAPTURE)]
+    assert kinds.count(KIND_TICK) == 16
+    assert kinds.count(KIND_FRAME) == 60
+
+def test_control_loop_reproduces_recorded_frames(monkeypatch):
+    monkeypatch.setattr(service, "FAILSAFE_BOOST", None)
+    for recorded, replayed in asyncio.run(replay_control(CAPTURE)):
+        assert replayed == recorded
+
+def test_recorder_appends_across_restarts(tmp_path):
+    path = str(tmp_path / "llcw.cap")
+    first = Recorder(path)
+    first.page(b"page 1")
+    first.frame(b"frame 1")
+    first.close()
+
+    # A crash in the middle of a record leaves a partial one behind
+    with open(path, "ab") as f:
+        f.write(bytes([KIND_PAGE]) + b"\0\0")
+
+    second = Recorder(path)
+    second.page(b"page 2")
+    second.close()
+
+    data = open(path, "rb").read()
+    assert data.count(b"LLCWUSB") == 1
+    records = load_capture(path)
+    assert [(kind, payload) for kind, _, payload in records] == [
+        (KIND_START, b""), (KIND_PAGE, b"page 1"), (KIND_FRAME, b"frame 1"),
+        (KIND_START, b""), (KIND_PAGE, b"page 2"),
+    ]
+    times = [t_ns for _, t_ns, _ in records]
+    assert times == sorted(times)
+    assert [[payload for _, _, payload in s] for s in load_sessions(path)] == [[b"page 1", b"frame 1"], [b"page 2"]]
+
+def test_recorder_replaces_header_cut_short(tmp_path):
+    path = tmp_path / "llcw.cap"
+    path.write_bytes(b"LLCW")
+    Recorder(str(path)).close()
+    assert len(path.read_bytes()) > FILE_HEADER.size
+    assert [kind for kind, _, _ in load_capture(str(path))] == [KIND_START]
@@ -0,0 +1,63 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+from models import Fan, SystemStatus
+from protocol import encode_status
+from shm import MAX_FANS, StatusReader, StatusSegment
+
+sys.path.insert(0, str(Path(os.path.realpath(__file__)).parent.parent / "bench"))
+import shm_torture
+
+
+def make_status(count: int, mark: int) -> SystemStatus:
+    fans = [
+        Fan(
+            mac=f"00:00:00:00:00:{j:02x}",
+            master_mac="00:00:00:00:00:00",
+            channel=1,
+            rx_type=0,
+            fan_count=3,
+            pwm=mark,
+            rpm=[mark] * 4,
+            target_pwm=mark,
+            is_bound=False
+        )
+        for j in range(count)
+    ]
+    return SystemStatus(timestamp=float(mark), cpu_temp=40.0, fans=fans)
+
+@pytest.fixture
+def segment(tmp_path):
+    segment = StatusSegment(str(tmp_path / "status.shm"))
+    yield segment
+    segment.close(unlink=True)
+
+
+def test_empty_segment_reads_none(segment):
+    reader = StatusReader(segment.path)
+    assert reader.read() is None
+    reader.close()
+
+def test_publish_and_read(segment):
+    reader = StatusReader(segment.path)
+    segment.publish(encode_status(make_status(3, 10)))
+    first = reader.read()
+    segment.publish(encode_status(make_status(1, 20)))
+    second = reader.read()
+    reader.close()
+
+    assert first.timestamp == 10.0 and len(first.fans) == 3
+    assert first.fans[2].rpm == (10,) * 4
+    assert second.timestamp == 20.0 and len(second.fans) == 1
+
+def test_publish_truncates_to_capacity(segment):
+    segment.publish(encode_status(make_status(MAX_FANS + 5, 1)))
+    reader = StatusReader(segment.path)
+    assert len(reader.read().fans) == MAX_FANS
+    reader.close()
+
+def test_concurrent_writers_and_readers():
+    assert shm_torture.torture(writers=2, readers=2, rounds=300)
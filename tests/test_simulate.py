@@ -0,0 +1,37 @@
+import pytest
+from pydantic import ValidationError
+
+from models import Curve
+from simulate import Trace, simulate, synthetic_trace
+
+
+def test_first_tick_steps_towards_target():
+    curve = Curve()
+    result = simulate(Trace([(0.0, 85.0), (10.0, 85.0)]), curve, start_pwm=100)
+    # The virtual clock starts at 0, which must not swallow the first step
+    assert result.samples[0][4] == 100 + curve.pwm_step
+
+@pytest.mark.parametrize("duration, interval", [(600.0, 0.0), (0.0, 1.0), (600.0, -1.0)])
+def test_synthetic_trace_rejects_bad_timing(duration, interval):
+    with pytest.raises(ValueError):
+        synthetic_trace("step", duration, interval)
+
+def test_curve_rejects_empty_temp_range():
+    with pytest.raises(ValidationError):
+        Curve(min_temp=50, max_temp=50)
+
+@pytest.mark.parametrize("fields", [
+    {"min_pwm": -1},
+    {"max_pwm": 256},
+    {"min_pwm": 120, "max_pwm": 100},
+    {"pwm_step": 0},
+    {"pwm_step": -4},
+])
+def test_curve_rejects_bad_pwm(fields):
+    with pytest.raises(ValidationError):
+        Curve(**fields)
+
+@pytest.mark.parametrize("devices", [0, -1])
+def test_simulate_rejects_no_devices(devices):
+    with pytest.raises(ValueError):
+        simulate(synthetic_trace("step", 60.0), devices=devices)
@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import service
+from parseArg import extractVersion
+from updates import VerifyError, cache_path, download
+
+DATA = os.urandom(300_000)
+DIGEST = f"sha256:{hashlib.sha256(DATA).hexdigest()}"
+
+
+class InstallerServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), InstallerHandler)
+        self.ranges = []
+        self.drop_after = None
+        self.ignore_range = False
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/llcw.rpm"
+
+class InstallerHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server: InstallerServer = self.server
+        rng = self.headers.get("Range")
+        server.ranges.append(rng)
+        start = int(rng.split("=")[1].split("-")[0]) if rng and not server.ignore_range else 0
+        if start >= len(DATA):
+            self.send_response(416)
+            self.end_headers()
+            return
+
+        body = DATA[start:]
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(DATA) - 1}/{len(DATA)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if server.drop_after is not None:
+            # Cut the connection once, mid body
+            drop_after, server.drop_after = server.drop_after, None
+            self.wfile.write(body[:drop_after])
+            self.wfile.flush()
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = InstallerServer()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def fetch(server, dest, digest=DIGEST):
+    async def run():
+        async with httpx.AsyncClient() as client:
+            return await download(client, server.url, dest, digest)
+    return asyncio.run(run())
+
+
+def test_resumes_after_dropped_connection(server, tmp_path):
+    server.drop_after = 100_000
+    dest = fetch(server, tmp_path / "llcw.rpm")
+
+    assert dest.read_bytes() == DATA
+    assert server.ranges[0] is None
+    resumed_at = int(server.ranges[1].split("=")[1].rstrip("-"))
+    assert 0 < resumed_at <= 100_000
+    assert not (tmp_path / "llcw.rpm.part").exists()
+
+def test_complete_part_gets_416_and_is_used(server, tmp_path):
+    (tmp_path / "llcw.rpm.part").write_bytes(DATA)
+    dest = fetch(server, tmp_path / "llcw.rpm")
+
+    assert dest.read_bytes() == DATA
+    assert server.ranges == [f"bytes={len(DATA)}-"]
+
+def test_restarts_when_server_ignores_range(server, tmp_path):
+    server.ignore_range = True
+    (tmp_path / "llcw.rpm.part").write_bytes(b"\0" * 1000)
+    dest = fetch(server, tmp_path / "llcw.rpm")
+
+    assert dest.read_bytes() == DATA
+    assert server.ranges == ["bytes=1000-"]
+
+def test_digest_mismatch_is_rejected(server, tmp_path):
+    with pytest.raises(VerifyError):
+        fetch(server, tmp_path / "llcw.rpm", "sha256:" + "0" * 64)
+
+    assert not (tmp_path / "llcw.rpm").exists()
+    assert not (tmp_path / "llcw.rpm.part").exists()
+
+def test_verified_download_is_reused(server, tmp_path):
+    dest = fetch(server, tmp_path / "llcw.rpm")
+    fetch(server, dest)
+    assert len(server.ranges) == 1
+
+
+@pytest.fixture
+def prefetched(tmp_path, monkeypatch):
+    ver = extractVersion("1.2.0-rel1", installer_url="https://example.invalid/llcw.rpm", installer_name="llcw.rpm")
+    path = cache_path(tmp_path / "prefetch", ver)
+    path.parent.mkdir(parents=True)
+    path.write_bytes(DATA)
+    monkeypatch.setattr(service, "PREFETCH_DIR", tmp_path / "prefetch")
+    monkeypatch.setattr(service, "LATEST_VER", ver)
+    monkeypatch.setattr(service, "PREFETCH_DONE", ver.raw_tag)
+    return ver
+
+def fetch_from_daemon(tag, dest):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=service.app)) as client:
+            return await download(client, f"http://localhost/update/installer/{tag}", dest, DIGEST)
+    return asyncio.run(run())
+
+def test_daemon_hands_over_prefetched_installer(prefetched, tmp_path):
+    # A part left by an earlier download is resumed from the daemon's copy
+    (tmp_path / "llcw.rpm.part").write_bytes(DATA[:1000])
+    dest = fetch_from_daemon(prefetched.raw_tag, tmp_path / "llcw.rpm")
+    assert dest.read_bytes() == DATA
+
+def test_daemon_only_hands_over_finished_prefetch(prefetched, tmp_path, monkeypatch):
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch_from_daemon("1.1.0-rel1", tmp_path / "llcw.rpm")
+
+    monkeypatch.setattr(service, "PREFETCH_DONE", None)
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch_from_daemon(prefetched.raw_tag, tmp_path / "llcw.rpm")